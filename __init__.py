@@ -1,2 +1,3 @@
 from .strategy import Strategy
-
+from .sweep import Sweep
+from .portfolio import Portfolio
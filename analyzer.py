@@ -6,6 +6,7 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
+from .drawdown import rolling_max_drawdown, rolling_extreme
 
 #####################################################################
 # CONSTANTS
@@ -93,10 +94,8 @@ def max_drawdown(pl):
 
 
 def rolling_max_dd(pl, period):
-    def max_dd(pl):
-        return np.max(1 - pl / pd.expanding_max(pl))
-
-    df = pd.rolling_apply(pl, window=period, func=max_dd)
+    """ rolling max drawdown over a period-bar window O(N) """
+    df = rolling_max_drawdown(pl, period)
     return df.dropna()
 
 
@@ -180,13 +179,16 @@ def analysis(pl, dbal, capital, tpl):
     stats['最大回撤恢复时长'] = _difference_in_years(datetime.strptime(
         dd['start_date'], '%Y-%m-%d'), datetime.strptime(dd['end_date'], '%Y-%m-%d'))
 
-    dd = rolling_max_dd(pl, TRADING_DAYS_PER_YEAR)
+    # 年、月、周滚动回撤一次计算
+    dds = rolling_max_drawdown(
+        pl, [TRADING_DAYS_PER_YEAR, TRADING_DAYS_PER_MONTH, TRADING_DAYS_PER_WEEK])
+    dd = dds[TRADING_DAYS_PER_YEAR].dropna()
     stats['平均年回撤'] = np.average(dd)
     stats['最大年回撤'] = max(dd)
-    dd = rolling_max_dd(pl, TRADING_DAYS_PER_MONTH)
+    dd = dds[TRADING_DAYS_PER_MONTH].dropna()
     stats['平均月回撤'] = np.average(dd)
     stats['最大月回撤'] = max(dd)
-    dd = rolling_max_dd(pl, TRADING_DAYS_PER_WEEK)
+    dd = dds[TRADING_DAYS_PER_WEEK].dropna()
     stats['平均周回撤'] = np.average(dd)
     stats['最大周回撤'] = max(dd)
     stats['交易笔数'] = len(tpl)
@@ -205,3 +207,108 @@ def analysis(pl, dbal, capital, tpl):
     res.columns = ['value']
     res.index.name = "Performance Statistics"
     return res
+
+
+#####################################################################
+# BATCH STATS - many equity curves at once (e.g. after a parameter sweep)
+
+
+def _batch_trade_stats(tpl, runs):
+    """ per-run trade statistics from a stacked trade pl table """
+    cols = ['交易笔数', '平均每笔交易收益', '单笔交易最大盈利', '单笔交易最大亏损', '盈亏比', '胜率']
+    if tpl is None:
+        return pd.DataFrame(index=runs, columns=cols, dtype=float)
+    key = tpl['run'] if 'run' in tpl.columns else tpl.index.get_level_values(0)
+    rets = tpl['returns']
+    g = rets.groupby(key)
+    res = pd.DataFrame(index=runs, columns=cols, dtype=float)
+    res['交易笔数'] = g.count()
+    res['平均每笔交易收益'] = g.mean()
+    res['单笔交易最大盈利'] = g.max()
+    res['单笔交易最大亏损'] = g.min()
+    win = rets[rets > 0].groupby(key[(rets > 0).values])
+    loss = rets[rets < 0].groupby(key[(rets < 0).values])
+    res['盈亏比'] = win.mean() / loss.mean().abs()
+    res['胜率'] = win.count().reindex(runs).fillna(0) / res['交易笔数']
+    res['交易笔数'] = res['交易笔数'].fillna(0)
+    return res
+
+
+def batch_analysis(pls, capital, tpl=None, holds=None):
+    """
+    Compute trading stats for many equity curves, column-wise vectorized
+
+    Parameters
+    ----------
+    pls : DataFrame; 净值矩阵，行为交易日，列为各次回测
+    capital: int or Series; 初始资金
+    tpl: DataFrame; 各次回测的每笔交易盈亏信息纵向拼接，含'returns'列，
+         以'run'列或第一层索引标识所属回测，如 pd.concat({run: tpl, ...})
+    holds: DataFrame; 可选，与pls同形状的每日总持仓量，用于计算持仓时间占比
+
+    Returns
+    -------
+    stats : DataFrame, 行为各次回测，列同analysis的统计项
+    """
+    idx = pls.index
+    runs = pls.columns
+    pl = pls.values.astype(np.float64)
+    n = len(idx)
+    stats = pd.DataFrame(index=runs)
+
+    # OVERALL RESULTS
+    years = _difference_in_years(idx[0], idx[-1])
+    stats['起始日'] = idx[0].strftime('%Y-%m-%d')
+    stats['结束日'] = idx[-1].strftime('%Y-%m-%d')
+    stats['初始资金'] = capital
+    stats['结束资金'] = pl[-1]
+    stats['总盈亏'] = pl[-1] - pl[0]
+    stats['累计收益'] = (pl[-1] - pl[0]) / pl[0]
+    stats['年化收益'] = _cagr(pl[-1], pl[0], years)
+    rets = pl[1:] / pl[:-1] - 1
+    stats['年化波动率'] = np.std(rets, axis=0) * np.sqrt(TRADING_DAYS_PER_YEAR)
+    stats['交易时长'] = trading_period(pls.iloc[:, 0]) if len(runs) else None
+    if holds is not None:
+        stats['持仓时间占比'] = (holds.values != 0).sum(0) / n
+    else:
+        stats['持仓时间占比'] = np.nan
+
+    # DRAWDOWN
+    running_max = np.maximum.accumulate(pl, axis=0)
+    dd = 1 - pl / running_max
+    end = dd.argmax(0)
+    cols = np.arange(len(runs))
+    peak = running_max[end, cols]
+    start = (pl == peak).argmax(0)
+    recovered = (pl > peak) & (np.arange(n)[:, None] > end)
+    has_recovery = recovered.any(0)
+    dates = np.array(idx.strftime('%Y-%m-%d'), dtype=object)
+    max_dd = np.maximum(dd.max(0), 0)
+    stats['最大回撤'] = max_dd
+    stats['年化收益回撤比'] = stats['年化收益'].values / dd.max(0)
+    stats['最大回撤起始期'] = dates[start]
+    stats['最大回撤结束期'] = dates[end]
+    stats['最大回撤恢复期'] = np.where(has_recovery, dates[recovered.argmax(0)], '还未恢复')
+    days = idx.normalize()
+    spans = days[end] - days[start]
+    stats['最大回撤恢复时长'] = (spans.days + spans.seconds / 86400) / 365.2425
+
+    for period, name in ((TRADING_DAYS_PER_YEAR, '年'), (TRADING_DAYS_PER_MONTH, '月'),
+                         (TRADING_DAYS_PER_WEEK, '周')):
+        rdd = rolling_extreme(pl, period)[period - 1:]
+        stats['平均%s回撤' % name] = rdd.mean(0) if len(rdd) else np.nan
+        stats['最大%s回撤' % name] = rdd.max(0) if len(rdd) else np.nan
+
+    trades = _batch_trade_stats(tpl, runs)
+    for col in trades.columns:
+        stats[col] = trades[col].values
+
+    # RATIOS
+    mean = rets.mean(0)
+    neg = np.where(rets < 0, rets, np.nan)
+    stats['夏普率'] = mean * TRADING_DAYS_PER_YEAR / \
+        (np.std(rets, axis=0) * np.sqrt(TRADING_DAYS_PER_YEAR))
+    stats['索提诺比率'] = mean * TRADING_DAYS_PER_YEAR / \
+        (np.nanstd(neg, axis=0) * np.sqrt(TRADING_DAYS_PER_YEAR))
+    stats.index.name = 'run'
+    return stats
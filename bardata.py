@@ -0,0 +1,289 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import numpy as np
+import pandas as pd
+
+
+# 回测行情数据容器：(标的 × 时间 × 字段) 连续numpy数组 + 移动游标
+# algo 中通过 data[sec].close / data[sec]['close'] 获取截止当前bar的只读视图，
+# 视图为原数组的切片，创建代价为O(1)，不随回测长度增长；
+# 设置lookback后视图只包含最近lookback根bar
+class BarData(object):
+
+    ragged = False  # 各标的是否只包含自身实际存在的bar(见RaggedBarData)
+
+    def __init__(self, values, items, index, fields, lookback=None):
+        '''
+        param values: numpy.ndarray, shape为(标的数, 时间长度, 字段数)
+        param items: 标的名列表
+        param index: pandas.DatetimeIndex, 时间轴
+        param fields: 字段名列表, 如 open,high,low,close,volume,amount
+        param lookback: int, 视图的最大长度(bar数)，默认None为截止当前bar的全部历史
+        '''
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        values.flags.writeable = False
+        self._values = values
+        self._items = list(items)
+        self._index = index
+        self._fields = list(fields)
+        self._field_pos = {f: i for i, f in enumerate(self._fields)}
+        self._cursor = -1  # 当前bar在时间轴上的位置
+        self._lookback = lookback
+        self._begin = 0  # 视图在时间轴上的起始位置
+        self._indicators = {}  # 指标名: shape (标的数, 时间长度)的只读数组
+        self._views = {sec: SecurityData(self, i)
+                       for i, sec in enumerate(self._items)}
+
+    # 由DataHandler返回的pandas.Panel构造
+    @classmethod
+    def from_panel(cls, panel, lookback=None):
+        return cls(panel.values, panel.items, panel.major_axis, panel.minor_axis,
+                   lookback)
+
+    # 移动游标至第i根bar
+    def seek(self, i):
+        self._cursor = i
+        if self._lookback is not None:
+            self._begin = max(0, i + 1 - self._lookback)
+
+    @property
+    def cursor(self):
+        return self._cursor
+
+    @property
+    def lookback(self):
+        return self._lookback
+
+    # 当前bar的时间戳
+    @property
+    def now(self):
+        return self._index[self._cursor]
+
+    @property
+    def items(self):
+        return self._items
+
+    @property
+    def fields(self):
+        return self._fields
+
+    # 视图对应的时间轴
+    @property
+    def index(self):
+        return self._index[self._begin:self._cursor + 1]
+
+    def keys(self):
+        return self._items
+
+    def __getitem__(self, sec):
+        return self._views[sec]
+
+    def __contains__(self, sec):
+        return sec in self._views
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    # 加入预先计算的指标，algo中与行情字段一样按 data[sec][name] 获取截止当前bar的视图
+    def add_indicator(self, name, values):
+        '''
+        param name: str, 指标名，不能与行情字段同名
+        param values: numpy.ndarray, shape为(标的数, 时间长度)
+        '''
+        if name in self._field_pos:
+            raise ValueError('indicator name %s conflicts with data field' % name)
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        if values.shape != self._values.shape[:2]:
+            raise ValueError('indicator shape must be (securities, time)')
+        values.flags.writeable = False
+        self._indicators[name] = values
+
+    @property
+    def indicators(self):
+        return list(self._indicators)
+
+    # 某标的某字段(或指标)截止当前bar的数据视图
+    def _column(self, pos, field):
+        fpos = self._field_pos.get(field)
+        if fpos is None:
+            return self._indicators[field][pos, self._begin:self._cursor + 1]
+        return self._values[pos, self._begin:self._cursor + 1, fpos]
+
+    # 某标的截止当前bar的全部字段视图, shape为(时间, 字段)
+    def _block(self, pos):
+        return self._values[pos, self._begin:self._cursor + 1, :]
+
+    # 某标的视图的时间轴及长度
+    def _sec_index(self, pos):
+        return self.index
+
+    def _sec_len(self, pos):
+        return self._cursor + 1 - self._begin
+
+    # 部分标的在主时间轴第lo至第hi根bar(含)的某字段数据, shape为(len(secs), hi - lo + 1)
+    def window(self, field, secs, lo, hi):
+        '''
+        param secs: 标的位置(同items顺序)的数组
+        '''
+        return self._values[secs, lo:hi + 1, self._field_pos[field]]
+
+    # 兼容旧策略：返回截止当前bar的pandas.Panel（需复制数据，较慢）
+    def to_panel(self):
+        b, c = self._begin, self._cursor + 1
+        return pd.Panel(self._values[:, b:c, :], items=self._items,
+                        major_axis=self._index[b:c], minor_axis=self._fields)
+
+
+# 单标的行情视图，由BarData创建并复用，随BarData游标移动
+class SecurityData(object):
+
+    __slots__ = ('_bars', '_pos')
+
+    def __init__(self, bars, pos):
+        self._bars = bars
+        self._pos = pos
+
+    # data[sec]['close'] 返回截止当前bar的收盘价数组
+    def __getitem__(self, field):
+        return self._bars._column(self._pos, field)
+
+    # data[sec].close 与 data[sec]['close'] 等价
+    def __getattr__(self, field):
+        if field.startswith('_'):
+            raise AttributeError(field)
+        try:
+            return self._bars._column(self._pos, field)
+        except KeyError:
+            raise AttributeError(field)
+
+    def __len__(self):
+        return self._bars._sec_len(self._pos)
+
+    @property
+    def index(self):
+        return self._bars._sec_index(self._pos)
+
+    @property
+    def columns(self):
+        return self._bars.fields
+
+    # shape为(时间, 字段)的只读数组视图
+    @property
+    def values(self):
+        return self._bars._block(self._pos)
+
+    # 某字段的滑动窗口视图，shape为(len - window + 1, window)，第k行为以视图第k + window - 1根bar
+    # 结尾的窗口，不复制数据，如 data[sec].rolling('close', 20).mean(axis=1) 即20日均线
+    def rolling(self, field, window):
+        col = self[field]
+        n = len(col) - window + 1
+        if window < 1 or n < 1:
+            return np.empty((0, max(window, 0)))
+        stride = col.strides[0]
+        return np.lib.stride_tricks.as_strided(col, shape=(n, window),
+                                               strides=(stride, stride),
+                                               writeable=False)
+
+    # 兼容旧策略：返回截止当前bar的pandas.DataFrame（需复制数据）
+    def to_frame(self):
+        return pd.DataFrame(self.values, index=self.index,
+                            columns=self._bars.fields)
+
+
+# 非对齐行情(Universe)的数据容器：data[sec]只包含该标的截止当前bar自身实际存在的bar，
+# 停牌等缺失的bar不以NaN填充；lookback为该标的最近lookback根bar
+class RaggedBarData(BarData):
+
+    ragged = True
+
+    def __init__(self, universe, lookback=None):
+        '''
+        param universe: Universe, 非对齐行情
+        param lookback: int, 视图的最大长度(bar数)，默认None为截止当前bar的全部历史
+        '''
+        self._universe = universe
+        self._values = universe._values  # (总bar数, 字段数)
+        self._rows = universe._rows
+        self._offsets = universe._offsets
+        self._items = list(universe.items)
+        self._index = universe.major_axis
+        self._fields = list(universe.minor_axis)
+        self._field_pos = {f: i for i, f in enumerate(self._fields)}
+        self._cursor = -1
+        self._lookback = lookback
+        self._begin = 0
+        self._spans = {}  # 当前游标下各标的视图在values中的区间
+        self._indicators = {}  # 指标名: shape (总bar数,)的只读数组
+        self._views = {sec: SecurityData(self, i)
+                       for i, sec in enumerate(self._items)}
+
+    @classmethod
+    def from_panel(cls, panel, lookback=None):
+        raise TypeError('use RaggedBarData(universe) for ragged data')
+
+    def seek(self, i):
+        BarData.seek(self, i)
+        self._spans.clear()
+
+    def _span(self, pos):
+        span = self._spans.get(pos)
+        if span is None:
+            lo, hi = self._offsets[pos], self._offsets[pos + 1]
+            stop = lo + np.searchsorted(self._rows[lo:hi], self._cursor, 'right')
+            start = lo if self._lookback is None else max(lo, stop - self._lookback)
+            span = self._spans[pos] = (start, stop)
+        return span
+
+    def add_indicator(self, name, values):
+        '''
+        param values: numpy.ndarray, shape为(总bar数,)，与Universe中各标的bar一一对应
+        '''
+        if name in self._field_pos:
+            raise ValueError('indicator name %s conflicts with data field' % name)
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        if values.shape != (len(self._values),):
+            raise ValueError('indicator shape must be (total bars,)')
+        values.flags.writeable = False
+        self._indicators[name] = values
+
+    def _column(self, pos, field):
+        start, stop = self._span(pos)
+        fpos = self._field_pos.get(field)
+        if fpos is None:
+            return self._indicators[field][start:stop]
+        return self._values[start:stop, fpos]
+
+    def _block(self, pos):
+        start, stop = self._span(pos)
+        return self._values[start:stop, :]
+
+    def _sec_index(self, pos):
+        start, stop = self._span(pos)
+        return self._index[self._rows[start:stop]]
+
+    def _sec_len(self, pos):
+        start, stop = self._span(pos)
+        return stop - start
+
+    # 只对所取标的在[lo, hi]内自身存在的bar取值，其余为NaN
+    def window(self, field, secs, lo, hi):
+        fpos = self._field_pos[field]
+        out = np.full((len(secs), hi - lo + 1), np.nan)
+        for n, pos in enumerate(secs):
+            a, b = self._offsets[pos], self._offsets[pos + 1]
+            own = self._rows[a:b]
+            start = a + np.searchsorted(own, lo, 'left')
+            stop = a + np.searchsorted(own, hi, 'right')
+            out[n, self._rows[start:stop] - lo] = self._values[start:stop, fpos]
+        return out
+
+    # 兼容旧策略：返回截止当前bar的对齐pandas.Panel（需生成稠密数组，较慢）
+    def to_panel(self):
+        b, c = self._begin, self._cursor + 1
+        return pd.Panel(self._universe.values[:, b:c, :], items=self._items,
+                        major_axis=self._index[b:c], minor_axis=self._fields)
@@ -0,0 +1,232 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import io
+import os
+import json
+import time
+import zlib
+import contextlib
+import numpy as np
+import pandas as pd
+
+from .strategy import Strategy
+from .analyzer import analysis
+from .profiler import peak_memory_mb
+
+#####################################################################
+# 回测引擎性能基准：以确定性的合成行情(与DataHandler读取的csv格式相同)
+# 测试不同标的数、数据频率、下单频率下的回测吞吐量及analysis()耗时，
+# 结果为可机读的pandas.DataFrame，可导出json/csv用于跟踪性能变化
+
+# 合成行情的起始日
+_START = '2010-01-04'
+
+# 标准测试场景：标的数、分钟数据频率(None为日频)、交易日数、每隔多少根bar调仓一次
+SCENARIOS = [
+    dict(name='daily_1', securities=1, minute=None, days=2500, order_every=5),
+    dict(name='daily_50', securities=50, minute=None, days=1000, order_every=5),
+    dict(name='daily_500', securities=500, minute=None, days=250, order_every=5),
+    dict(name='minute_1', securities=1, minute=1, days=60, order_every=30),
+    dict(name='minute_50', securities=50, minute=1, days=10, order_every=30),
+    dict(name='orders_low', securities=50, minute=None, days=1000, order_every=60),
+    dict(name='orders_high', securities=50, minute=None, days=1000, order_every=1),
+    dict(name='analysis_long', securities=1, minute=None, days=7500, order_every=20),
+]
+
+# 一个交易日内的1分钟bar时刻(09:31-11:30, 13:01-15:00，共240根)
+_SESSION = np.concatenate([np.arange(9 * 60 + 31, 11 * 60 + 31),
+                           np.arange(13 * 60 + 1, 15 * 60 + 1)])
+
+
+def _security_names(n):
+    return ['SYN%04d' % i for i in range(n)]
+
+
+# 单个标的的合成OHLCV数据，由种子及标的名确定，重复生成结果相同
+def synthetic_bars(security, days, minute=None, seed=0):
+    '''
+    param security: str, 标的名
+    param days: int, 交易日数
+    param minute: int, 分钟数据频率，None为日频
+    param seed: int, 随机种子
+
+    return: pandas.DataFrame, index为date, 列为open,high,low,close,volume,amount
+    '''
+    rng = np.random.RandomState((seed * 1000003 + zlib.crc32(security.encode())) % 2 ** 32)
+    dates = pd.bdate_range(_START, periods=days)
+    if minute is None:
+        index = dates
+        sigma = 0.02
+    else:
+        session = _SESSION[minute - 1::minute]
+        offsets = (dates.values.astype('datetime64[m]')[:, None]
+                   + session[None, :].astype('timedelta64[m]')).ravel()
+        index = pd.DatetimeIndex(offsets.astype('datetime64[ns]'))
+        sigma = 0.02 / np.sqrt(len(session))
+
+    n = len(index)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, sigma, n)))
+    open_ = np.concatenate([[10.0], close[:-1]]) * (1 + rng.normal(0, sigma / 4, n))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, sigma / 2, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, sigma / 2, n)))
+    volume = rng.randint(1000, 100000, n).astype(np.float64)
+    df = pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close,
+                       'volume': volume, 'amount': volume * close},
+                      index=index,
+                      columns=['open', 'high', 'low', 'close', 'volume', 'amount'])
+    df.index.name = 'date'
+    return df.round(4)
+
+
+# 按DataHandler的目录结构写出合成数据: path/Daily/XXXX.csv 或 path/Minute/X/XXXX.csv
+def write_synthetic(path, securities, days, minute=None, seed=0):
+    '''
+    return: list, 写出的标的名
+    '''
+    names = _security_names(securities)
+    sub = 'Daily' if minute is None else os.path.join('Minute', str(minute))
+    folder = os.path.join(path, sub)
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    for sec in names:
+        file_ = os.path.join(folder, sec + '.csv')
+        if not os.path.exists(file_):
+            synthetic_bars(sec, days, minute, seed).to_csv(file_)
+    return names
+
+
+# 基准策略：每隔order_every根bar对所有标的交替开平仓
+def _bench_algo(data, broker, context):
+    context.bar += 1
+    if context.bar % context.order_every != 0:
+        return
+    weight = 1.0 / len(context.securities)
+    for sec in context.securities:
+        price = data[sec].close[-1]
+        if not price > 0:
+            continue
+        vol = broker.curr_sec_hold_volume(sec)
+        if vol == 0:
+            broker.order_percent(sec, price, weight, 'long')
+        else:
+            broker.order_share(sec, price, -vol, 'long')
+
+
+def _bench_init(context, spec, path):
+    index = pd.bdate_range(_START, periods=spec['days'])
+    context.data_path = path
+    context.securities = _security_names(spec['securities'])
+    context.start = str(index[0].date())
+    context.end = str(index[-1].date())
+    if spec['minute'] is not None:
+        context.minute = spec['minute']
+    context.order_every = spec['order_every']
+    context.bar = 0
+
+
+# 执行单个场景，返回耗时统计
+def run_scenario(spec, path, seed=0):
+    '''
+    param spec: dict, 同SCENARIOS中的元素
+    param path: str, 合成数据目录
+
+    return: dict, 场景名、bar数、下单数、读取耗时、回测耗时、analysis耗时、bars/sec、orders/sec、峰值内存(MB)
+    '''
+    write_synthetic(path, spec['securities'], spec['days'], spec['minute'], seed)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.time()
+        strategy = Strategy(_bench_init, spec=spec, path=path)
+        t1 = time.time()
+        strategy.run_backtest(_bench_algo)
+        t2 = time.time()
+        pl, dbal, tpl, tlog = strategy.backtest_result()
+        analysis(pl, dbal, strategy.get_context().cash, tpl)
+        t3 = time.time()
+
+    context = strategy.get_context()
+    bars = len(strategy.get_trading_data().major_axis)
+    orders = len(tlog)
+    run_seconds = t2 - t1
+    return {'scenario': spec['name'], 'securities': spec['securities'],
+            'minute': spec['minute'], 'bars': bars, 'algo_calls': context.bar,
+            'orders': orders, 'load_seconds': t1 - t0, 'run_seconds': run_seconds,
+            'analysis_seconds': t3 - t2,
+            'bars_per_sec': bars / run_seconds if run_seconds else np.nan,
+            'orders_per_sec': orders / run_seconds if run_seconds else np.nan,
+            'peak_rss_mb': peak_memory_mb()}
+
+
+# 依次执行多个场景，每个场景默认在独立进程中执行，使峰值内存互不影响
+def run(scenarios=None, path=None, scale=1.0, isolate=True, output=None, seed=0):
+    '''
+    param scenarios: list, 场景名或场景dict，默认为全部SCENARIOS
+    param path: str, 合成数据目录，默认为临时目录(结束后删除)
+    param scale: float, 交易日数的缩放比例(如0.1用于快速检查)
+    param isolate: bool, 是否每个场景使用独立进程
+    param output: str, 结果导出路径(.json 或 .csv)
+    param seed: int, 合成数据随机种子
+
+    return: pandas.DataFrame, 每行为一个场景的结果
+    '''
+    named = {s['name']: s for s in SCENARIOS}
+    specs = SCENARIOS if scenarios is None else \
+        [named[s] if isinstance(s, str) else s for s in scenarios]
+    specs = [dict(s, days=max(2, int(s['days'] * scale))) for s in specs]
+
+    tmp = None
+    if path is None:
+        import tempfile
+        path = tmp = tempfile.mkdtemp(prefix='wlk_bench_')
+    try:
+        rows = []
+        for spec in specs:
+            # 交易日数不同的场景使用不同目录，避免复用其它场景的数据文件
+            data_path = os.path.join(path, '%s_%d_%d' % (spec['name'], spec['days'], seed))
+            if isolate:
+                from concurrent.futures import ProcessPoolExecutor
+                with ProcessPoolExecutor(max_workers=1) as ex:
+                    rows.append(ex.submit(run_scenario, spec, data_path, seed).result())
+            else:
+                rows.append(run_scenario(spec, data_path, seed))
+    finally:
+        if tmp is not None:
+            import shutil
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    result = pd.DataFrame(rows).set_index('scenario')
+    if output is not None:
+        if output.endswith('.csv'):
+            result.to_csv(output)
+        else:
+            # DataFrame.to_json的indent参数需pandas>=1.0
+            with open(output, 'w') as f:
+                json.dump(result.reset_index().to_dict('records'), f, indent=2,
+                          default=_json_value)
+    return result
+
+
+# numpy数值转为python数值，其它类型(如时间戳)转为字符串
+def _json_value(value):
+    return value.item() if isinstance(value, np.generic) else str(value)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='wlkbacktest engine benchmark')
+    parser.add_argument('scenarios', nargs='*', help='scenario names, default all')
+    parser.add_argument('--path', default=None, help='synthetic data directory')
+    parser.add_argument('--scale', type=float, default=1.0, help='scale of trading days')
+    parser.add_argument('--output', default=None, help='export results to .json or .csv')
+    parser.add_argument('--no-isolate', action='store_true',
+                        help='run scenarios in the current process')
+    args = parser.parse_args(argv)
+    result = run(args.scenarios or None, args.path, args.scale,
+                 not args.no_isolate, args.output)
+    print(result.to_string())
+
+
+if __name__ == '__main__':
+    main()
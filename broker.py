@@ -2,16 +2,30 @@
 
 __author__ = 'wulinkai'
 
+from .ledger import LotLedger
+from .tradelog import ColumnBuffer
+from .onlinestats import OnlineStats
+from .resample import day_ends
+from .orderbook import OrderBook
+from .universe import Universe
+
 
 # 账户类（包含下单函数；每日所有标的持仓量、持仓成本、市值信息；历史每笔成交记录；未平仓记录）
 class Broker(object):
 
     import pandas as pd
-
-    _TRADE_LOG = ['datetime', 'security',
-                  'price', 'qty', 'state', 'long_short']
-    _UNCLOSED_ORDER = ['price', 'open_qty', 'long_short', 'cost']
-    _DAILY_BAL = ['date', 'price', 'holds', 'long_short', 'cost', 'hold_value']
+    import numpy as np
+
+    _TRADE_LOG = [('datetime', 'datetime'), ('security', 'category'),
+                  ('price', 'float64'), ('qty', 'float64'),
+                  ('direction', 'category'), ('long_short', 'category')]
+    _TRADE_PL = [('close_date', 'datetime'), ('trade_pl', 'float64'),
+                 ('cost', 'float64'), ('returns', 'float64'),
+                 ('trade_type', 'category')]
+    _DAILY_BAL = ['price', 'holds', 'long_short', 'cost', 'hold_value']
+    # 多空方向编码：1为多，-1为空，0为无持仓; _LS_NAME[code]解码
+    _LS_CODE = {'long': 1, 'short': -1, None: 0}
+    _LS_NAME = np.array([None, 'long', 'short'], dtype=object)
 
     def __init__(self, data, context):
         '''
@@ -25,16 +39,31 @@ class Broker(object):
 
         self.now = None  # 当前回测时间戳
         self._cash_ts = dict()  # 每日现金余额序列
-        self._trade_pl = []  # 每笔交易平仓盈亏序列
+        # ColumnBuffer;每笔交易平仓盈亏记录
+        self._trade_pl = ColumnBuffer(Broker._TRADE_PL, index='close_date')
 
-        # pandas.Panel;每个标的的每日持仓信息
-        self._dailybalance = self._init_daily_bal(data, context.minute)
+        # 每日持仓矩阵(交易日 × 标的): 收盘价、持仓量、持仓成本、持仓市值、多空方向
+        self._init_daily_bal(data, context.minute)
 
-        # dict,key:security,value:pandas.DataFrame;未平仓标的信息表
+        # dict,key:security,value:LotLedger;未平仓标的账本
         self._unclosed = self._init_unclosed_order(context.securities)
 
-        # pandas.DataFrame;所有成交记录表
-        self._tradelog = self.pd.DataFrame(columns=Broker._TRADE_LOG)
+        # 各标的当前持仓量、持仓成本、多空方向，随每笔开平仓同步，供每日一次性写入持仓矩阵
+        n = len(self._secs)
+        self._sec_holds = self.np.zeros(n)
+        self._sec_cost = self.np.zeros(n)
+        self._sec_ls = self.np.zeros(n, dtype=self.np.int8)
+
+        # ColumnBuffer;所有成交记录表
+        self._tradelog = ColumnBuffer(Broker._TRADE_LOG, index='datetime')
+
+        # OnlineStats;回测过程中逐日更新的夏普、回撤、胜率等统计信息，可在algo中查询
+        self.stats = OnlineStats()
+
+        # OrderBook;限价、止损挂单，回测中每根bar在algo之前撮合
+        self._book = OrderBook(self._secs)
+        # ExecutionSimulator;日内成交模拟(context.intrabar = True时由Strategy设置)
+        self._intrabar = None
 
 #####################################################################
 #   Initialize Helper Functions
@@ -44,46 +73,103 @@ class Broker(object):
         '''
         param securities: 所有订阅的标的，同context.securities
 
-        return res: 字典，key为单标的名，value为pandas dataframe
+        return res: 字典，key为单标的名，value为LotLedger
         '''
-        _df = self.pd.DataFrame(columns=Broker._UNCLOSED_ORDER)
-        res = {sec: _df.copy() for sec in securities}
+        res = {sec: LotLedger() for sec in securities}
         return res
 
-    # 初始化每个标的所有交易日持仓信息表
+    # 初始化每个标的所有交易日持仓信息矩阵
     def _init_daily_bal(self, data, minute):
         '''
         param data: 所有订阅的标的交易数据
         param minute: 策略数据频率，n分钟或日频数据。
-
-        return res: pandas.Panel
         '''
-        _dd = dict()
-        tdx = data.major_axis if minute is None else self.pd.DatetimeIndex(
-            self.pd.unique(data.major_axis.date))
-        for sec in data.items:
-            _df = self.pd.DataFrame(columns=Broker._DAILY_BAL)
-            _df['date'] = tdx
-            _df['holds'] = 0
-            _df['cost'] = 0
-            _df['hold_value'] = 0
-            _df['long_short'] = None
-            if minute is None:
-                _df['price'] = data[sec]['close'].fillna(method='ffill').values
-            else:
-                _df['price'] = data[sec].at_time(
-                    '15:00')['close'].fillna(method='ffill').values
-            _df = _df.set_index('date')
-            _dd[sec] = _df
-        res = self.pd.Panel(_dd)
-        return res
+        np = self.np
+        self._secs = list(data.items)
+        self._sec_pos = {sec: j for j, sec in enumerate(self._secs)}
+        tdx, close = self._daily_close(data, minute)
+
+        self._dates = tdx  # 交易日序列
+        shape = (len(tdx), len(self._secs))
+        self._bal_price = close.fillna(method='ffill').values.astype(np.float64)
+        self._bal_holds = np.zeros(shape)
+        self._bal_cost = np.zeros(shape)
+        self._bal_value = np.zeros(shape)
+        self._bal_ls = np.zeros(shape, dtype=np.int8)
+        self._dailybalance = None  # get_daily_balance生成的pandas.Panel缓存
+
+        # 每日总持仓市值、账户净值及净值的历史最高值，随update_broker逐日累积
+        self._hold_total = np.zeros(len(tdx))
+        self._equity = np.zeros(len(tdx))
+        self._equity_peak = np.zeros(len(tdx))
+        self._marked_rows = np.zeros(len(tdx), dtype=np.int64)  # 已更新净值的交易日行号
+        self._n_marked = 0
+
+    # 交易日序列及每日收盘价(高频数据取每日最后一根bar的价格)，列顺序同self._secs
+    def _daily_close(self, data, minute):
+        rows = None if minute is None else day_ends(data.major_axis)
+        if isinstance(data, Universe):
+            # 非对齐行情只生成每日收盘时刻的截面
+            close = data.minor_xs('close', rows)
+        else:
+            close = data.minor_xs('close')  # DataFrame, 时间 × 标的
+            if rows is not None:
+                close = close.iloc[rows]
+        tdx = data.major_axis if minute is None else close.index.normalize()
+        return tdx, close.reindex(columns=self._secs)
+
+    # 追加新的交易日(断点续跑时使用)，data为晚于已有交易日的新增交易数据
+    def extend(self, data, minute):
+        '''
+        param data: pandas.Panel，新增的交易数据
+        param minute: 策略数据频率，n分钟或日频数据
+        '''
+        np = self.np
+        tdx, close = self._daily_close(data, minute)
+        if len(self._dates) != 0 and len(tdx) != 0 and tdx[0] <= self._dates[-1]:
+            raise ValueError('new trading data must start after %s' % self._dates[-1])
+
+        # 新增收盘价接续已有收盘价向后填充
+        price = close.values.astype(np.float64)
+        if len(self._dates) != 0:
+            price = np.vstack([self._bal_price[-1:], price])
+            price = self.pd.DataFrame(price).fillna(method='ffill').values[1:]
+
+        n = len(tdx)
+        shape = (n, len(self._secs))
+        self._dates = self._dates.append(tdx)
+        self._bal_price = np.vstack([self._bal_price, price])
+        self._bal_holds = np.vstack([self._bal_holds, np.zeros(shape)])
+        self._bal_cost = np.vstack([self._bal_cost, np.zeros(shape)])
+        self._bal_value = np.vstack([self._bal_value, np.zeros(shape)])
+        self._bal_ls = np.vstack([self._bal_ls, np.zeros(shape, dtype=np.int8)])
+        self._dailybalance = None
+        self._hold_total = np.concatenate([self._hold_total, np.zeros(n)])
+        self._equity = np.concatenate([self._equity, np.zeros(n)])
+        self._equity_peak = np.concatenate([self._equity_peak, np.zeros(n)])
+        self._marked_rows = np.concatenate([self._marked_rows, np.zeros(n, dtype=np.int64)])
+
 #####################################################################
 #   Helper Functions
 
-    # 返回所有标的的总持仓市值序
-    def _hold_value_series(self):
-        dfs = self._dailybalance.swapaxes('items', 'minor')
-        return dfs['hold_value']
+    # 截止前一交易日的行号上界(不含当日)，即 self._dates[:k] 均早于当前交易日
+    def _prev_rows(self):
+        k = self._dates.searchsorted(self.now, 'right') - 1
+        return max(k, 0)
+
+    # 最近n个值的最大回撤，含0值(空仓)或无数据时返回None
+    def _window_drawdown(self, values):
+        if len(values) != 0 and (values != 0).all():
+            return self.np.max(1 - values / self.np.maximum.accumulate(values))
+
+    # 开平仓后同步该标的的当前持仓量、持仓成本及多空方向
+    def _sync_position(self, security):
+        j = self._sec_pos.get(security)
+        if j is not None:
+            ledger = self._unclosed[security]
+            self._sec_holds[j] = ledger.qty
+            self._sec_cost[j] = ledger.cost
+            self._sec_ls[j] = Broker._LS_CODE[ledger.long_short]
 
     # 记录成交下单
     def _record_trade(self, security, price, qty, direction, long_short):
@@ -94,10 +180,8 @@ class Broker(object):
         param direction: 开、平
         param long_short: 多、空
         '''
-        t = {'price': price, 'qty': abs(qty), 'long_short': long_short,
-             'datetime': self.now, 'security': security, 'direction': direction}
-
-        self._tradelog = self._tradelog.append(t, ignore_index=True)
+        self._tradelog.append(self.now, security, price, abs(qty),
+                              direction, long_short)
 
     # 开仓更新：原始持仓量、原始开仓成本加上新的开仓量及开仓成本
     def _open_update(self, security, price, open_qty, long_short):
@@ -105,45 +189,21 @@ class Broker(object):
         # 扣除手续费、及交易成本
         self._cash -= (1 + self._commission * 0.01) * price * open_qty
 
-        df = self._unclosed[security]
-        t = {'price': price, 'open_qty': open_qty,
-             'long_short': long_short, 'cost': open_qty * price}
-        df = df.append(t, ignore_index=True)
-        self._unclosed[security] = df
+        self._unclosed[security].open(price, open_qty, long_short)
+        self._sync_position(security)
 
     # 平仓更新：原始持仓量、原始开仓成本减去平仓量，并计算返回现金及盈亏
     def _close_update(self, security, close_price, close_qty, long_short):
 
-        df = self._unclosed[security]
-        re_cash_cost = 0  # 返回的成本
-        re_cash_pl = 0  # 返回的盈亏
-
-        for i in df.index:
-            vol_i = df.at[i, 'open_qty']
-            price_i = df.at[i, 'price']
-            price_diff = close_price - price_i
-            if vol_i < close_qty:
-                re_cash_pl += vol_i * price_diff if long_short == 'long' else vol_i * -price_diff
-                re_cash_cost += vol_i * price_i
-                df.at[i, 'open_qty'] = 0
-                df.at[i, 'cost'] = 0
-                close_qty -= vol_i
-            elif vol_i >= close_qty:
-                re_cash_pl += close_qty * \
-                    price_diff if long_short == 'long' else close_qty * -price_diff
-                re_cash_cost += close_qty * price_i
-                df.at[i, 'open_qty'] = vol_i - close_qty
-                df.at[i, 'cost'] = (vol_i - close_qty) * price_i
-                break
-
-        df = df[df.open_qty != 0]
-        df.index = range(len(df))
-        self._unclosed[security] = df
+        # 先开先平，返回平仓盈亏及平掉部分的开仓成本
+        re_cash_pl, re_cash_cost = self._unclosed[security].close(
+            close_price, close_qty, long_short)
+        self._sync_position(security)
 
         # 添加每笔平仓收益信息
-        dd = {'close_date': self.now, 'trade_pl': re_cash_pl, 'cost': re_cash_cost,
-              'returns': re_cash_pl / re_cash_cost, 'trade_type': long_short}
-        self._trade_pl.append(dd)
+        self._trade_pl.append(self.now, re_cash_pl, re_cash_cost,
+                              re_cash_pl / re_cash_cost, long_short)
+        self.stats.add_trade(re_cash_pl / re_cash_cost)
 
         # 减手续费
         self._cash -= self._commission * 0.01 * abs(close_price * close_qty)
@@ -158,6 +218,9 @@ class Broker(object):
         param shares: 交易量
         param long_short: 多、空
         '''
+        # 未加载交易数据(读取失败)的标的无法估值，不能交易
+        if security not in self._sec_pos:
+            raise KeyError('no trading data for %s' % security)
 
         # 获取标的的持仓量
         vol = self.curr_sec_hold_volume(security)
@@ -198,22 +261,48 @@ class Broker(object):
 
     # 更新账户每日持仓量、持仓成本及持仓市值(依据每日收盘价/结算价)
     def update_broker(self, datetime):
+        row = self._dates.get_loc(datetime)
+        self._mark_days(self.np.array([row]), self.np.array([self._cash]),
+                        self._sec_holds[None], self._sec_cost[None], self._sec_ls[None])
 
-        self._cash_ts[datetime] = self._cash
-
-        for sec in self._dailybalance.items:
-            df = self._dailybalance[sec]
-            open_order = self._unclosed[sec]
-            if len(open_order) != 0:
-                holds = open_order['open_qty'].sum()
-                cost = open_order['cost'].sum()
-                ls = open_order['long_short'].iat[-1]
-                df.at[datetime, 'holds'] = holds
-                df.at[datetime, 'cost'] = cost
-                df.at[datetime, 'long_short'] = ls
-                cal_value = df.at[datetime, 'price'] * holds
-                df.at[
-                    datetime, 'hold_value'] = cal_value if ls == 'long' else 2 * cost - cal_value
+    # 批量写入若干交易日的持仓信息及净值，空头市值为 2*成本-现价市值
+    def _mark_days(self, rows, cash, holds, cost, ls):
+        '''
+        param rows: 递增的交易日行号数组
+        param cash: 各交易日日终现金余额
+        param holds: (交易日 × 标的) 持仓量
+        param cost: (交易日 × 标的) 持仓成本
+        param ls: (交易日 × 标的) 多空方向编码
+        '''
+        np = self.np
+        cal_value = self._bal_price[rows] * holds
+        value = np.where(ls == -1, 2 * cost - cal_value, cal_value)
+        value = np.where(holds != 0, value, 0)
+        self._bal_holds[rows] = holds
+        self._bal_cost[rows] = cost
+        self._bal_ls[rows] = ls
+        self._bal_value[rows] = value
+        self._dailybalance = None
+        self._cash_ts.update(zip(self._dates[rows], cash))
+
+        # 累积总持仓市值、净值及净值最高值，接续已更新的交易日(同一交易日重复更新时覆盖)
+        total = np.nansum(value, axis=1)
+        equity = cash + total
+        n = self._n_marked
+        if n != 0 and self._marked_rows[n - 1] == rows[0]:
+            n -= 1
+            self.stats[-1] = equity[0]
+            self.stats.extend(equity[1:])
+        else:
+            self.stats.extend(equity)
+        peak = np.maximum.accumulate(equity)
+        if n != 0:
+            peak = np.maximum(peak, self._equity_peak[self._marked_rows[n - 1]])
+        self._marked_rows[n:n + len(rows)] = rows
+        self._n_marked = n + len(rows)
+        self._hold_total[rows] = total
+        self._equity[rows] = equity
+        self._equity_peak[rows] = peak
 
 #####################################################################
 # 回测结束后供strategy类调用
@@ -223,36 +312,47 @@ class Broker(object):
         pl = self.curr_portfolio()
         return pl
 
-    # 获取每个交易日持仓明细
+    # 获取每个交易日持仓明细，pandas.Panel，key为标的名，value为该标的每日持仓DataFrame
     def get_daily_balance(self):
+        if self._dailybalance is None:
+            _dd = dict()
+            for j, sec in enumerate(self._secs):
+                _df = self.pd.DataFrame({
+                    'price': self._bal_price[:, j],
+                    'holds': self._bal_holds[:, j],
+                    'long_short': Broker._LS_NAME[self._bal_ls[:, j]],
+                    'cost': self._bal_cost[:, j],
+                    'hold_value': self._bal_value[:, j]},
+                    index=self._dates, columns=Broker._DAILY_BAL)
+                _df.index.name = 'date'
+                _dd[sec] = _df
+            self._dailybalance = self.pd.Panel(_dd)
         return self._dailybalance
 
     # 获取成交记录
     def get_trade_record(self):
-        return self._tradelog.set_index('datetime')
+        return self._tradelog.to_frame()
 
     # 获取每笔交易盈亏信息
     def get_trade_pl(self):
-        tpl = self.pd.DataFrame(self._trade_pl)
-        tpl = tpl.set_index('close_date')
-        return tpl
+        return self._trade_pl.to_frame()
 
 #####################################################################
 #   可在algo函数中调用
 
     # 查找标的的最新持仓量
     def curr_sec_hold_volume(self, sec):
-        return self._unclosed[sec]['open_qty'].sum()
+        return self._unclosed[sec].qty
 
     # 查找标的的最新持仓市值序列,截止前一交易日
     def curr_sec_hold_value(self, sec):
-        v_ts = self._hold_value_series()
-        holdval = v_ts.ix[:self.now, sec]
-        return holdval[:-1]
+        k = self._prev_rows()
+        return self.pd.Series(self._bal_value[:k, self._sec_pos[sec]],
+                              index=self._dates[:k], name=sec)
 
     # 查找标的的多空方向
     def curr_sec_direction(self, sec):
-        return self._unclosed[sec]['long_short'][0]
+        return self._unclosed[sec].long_short
 
     # 查找最近n个交易期标的持仓市值的最大回撤
     def curr_sec_latest_drawdown(self, sec, n):
@@ -260,41 +360,41 @@ class Broker(object):
         param sec: 标的名
         param n: 往前n个bar期
         '''
-        pl = self.curr_sec_hold_value(sec)
-        pl = pl[-n:]
-        if (pl != 0).all():
-            return max(1 - pl / self.pd.expanding_max(pl))
+        k = self._prev_rows()
+        return self._window_drawdown(self._bal_value[max(k - n, 0):k, self._sec_pos[sec]])
 
     # 返回有仓位的标的数量
     def curr_hold_nums(self):
-        res = 0
-        for x in self._unclosed.values():
-            if len(x) != 0:
-                res += 1
-        return res
+        return int(self.np.count_nonzero(self._sec_holds))
 
     # 查找最近n个交易期总持仓市值的最大回撤
     def curr_latest_drawdown(self, n):
         '''
-        param sec: 标的名
         param n: 往前n个bar期
         '''
-        pl = self._hold_value_series().sum(1)
-        pl = pl[-n:]
-        if (pl != 0).all():
-            return max(1 - pl / self.pd.expanding_max(pl))
+        k = self._prev_rows()
+        return self._window_drawdown(self._hold_total[max(k - n, 0):k])
+
+    # 查找账户当前净值相对历史最高净值的回撤，截止最近一次更新净值
+    def curr_drawdown(self):
+        if self._n_marked == 0:
+            return 0.0
+        row = self._marked_rows[self._n_marked - 1]
+        return 1 - self._equity[row] / self._equity_peak[row]
 
     # 查找账户的最新总持仓市值序列,截止上一交易日
     def curr_hold_value(self):
-        v_ts = self._hold_value_series().sum(1)
-        return v_ts.ix[:self.now].ix[:-1]
+        k = self._prev_rows()
+        return self.pd.Series(self._hold_total[:k], index=self._dates[:k])
 
-    # 查找账户的最新净值序列,截止上一交易日
+    # 查找账户的最新净值序列,截止最近一次更新净值
     def curr_portfolio(self):
-        v_ts = self._hold_value_series().sum(1)
-        c_ts = self.pd.Series(self._cash_ts)
-        p_ts = self.pd.concat([v_ts, c_ts], axis=1).dropna()
-        return p_ts.sum(1)
+        n = self._n_marked
+        rows = self._marked_rows[:n]
+        # 逐日连续更新时直接切片，否则按行号选取
+        if n != 0 and rows[-1] - rows[0] == n - 1:
+            rows = slice(rows[0], rows[-1] + 1)
+        return self.pd.Series(self._equity[rows], index=self._dates[rows])
 
     # 账户下单函数
     # 按量（手）下单
@@ -345,6 +445,11 @@ class Broker(object):
         order_price: float or int; 下单价格
         percent: float; 正数为开仓，代表所占的剩余现金的比例；负数为平仓，代表持仓市值的比例
         long_short:str; 'long','short'
+
+        return
+        ----
+        True：成交
+        False:失败
         '''
         if percent < -1 or percent > 1:
             raise ValueError("percent must between - 1 to 1")
@@ -360,4 +465,194 @@ class Broker(object):
             vol = self.curr_sec_hold_volume(security)
             shares = int(vol * percent)
 
-        self.order_share(security, price, shares, long_short, real_price=True)
+        if shares == 0:  # 资金或持仓不足一股
+            return False
+        return self.order_share(security, price, shares, long_short, real_price=True)
+
+    # 按目标权重批量调仓：先平仓后开仓，开仓资金不足时按比例缩减，成交记录批量写入
+    def order_target_weights(self, weights, prices):
+        '''
+        param
+        -----
+        weights: dict or pandas.Series; key为标的名，value为目标持仓市值占账户净值的比例，正数为多，负数为空，
+                 0为平仓；未列出的标的持仓不变
+        prices: dict or pandas.Series; 各标的下单价格，缺失或非正数的标的不调仓
+
+        账户净值 = 现金 + 按prices计算的持仓市值(无价格的持仓按持仓成本计)；目标手数按下单价格向零取整
+
+        return
+        ----
+        pandas.Series: 各标的的持仓变化量(多头为正，空头为负)
+        '''
+        np, pd = self.np, self.pd
+        weights = pd.Series(weights, dtype=np.float64)
+        prices = pd.Series(prices, dtype=np.float64).reindex(weights.index)
+        ok = (prices > 0).values
+        weights, prices = weights[ok], prices[ok]
+        secs = list(weights.index)
+        missing = [sec for sec in secs if sec not in self._sec_pos]
+        if missing:
+            raise KeyError('no trading data for %s' % missing)
+        if len(secs) == 0:
+            return pd.Series(dtype=np.float64)
+
+        # 账户净值，空头市值为 2*成本-现价市值
+        pos = np.array([self._sec_pos[sec] for sec in secs])
+        all_px = np.full(len(self._secs), np.nan)
+        all_px[pos] = prices.values
+        value = np.where(self._sec_ls == -1, 2 * self._sec_cost - all_px * self._sec_holds,
+                         all_px * self._sec_holds)
+        value = np.where(np.isnan(all_px), self._sec_cost, value)
+        equity = self._cash + value[self._sec_holds != 0].sum()
+
+        # 当前及目标持仓(多为正，空为负)
+        px = prices.values
+        side = self._sec_ls[pos].astype(np.int64)
+        holds = self._sec_holds[pos]
+        current = side * holds
+        target = np.fix(weights.values * equity / px)
+
+        # 平仓量：目标方向相反时全部平仓，同向减仓时平掉差额
+        reverse = (side != 0) & (np.sign(target) != side)
+        close_qty = np.where(reverse, holds, np.maximum(holds - np.abs(target), 0))
+        close_qty = np.where(side != 0, close_qty, 0)
+        after = current - side * close_qty
+        open_qty = np.where(target != 0, np.maximum(np.abs(target) - np.abs(after), 0), 0)
+
+        slip = self._slippage * 0.01
+        comm = self._commission * 0.01
+        # 成交价：多开、空平上浮滑点，空开、多平下调滑点
+        close_px = np.round(px * np.where(side == 1, 1 - slip, 1 + slip), 2)
+        open_side = np.sign(target).astype(np.int64)
+        open_px = np.round(px * np.where(open_side == 1, 1 + slip, 1 - slip), 2)
+
+        log_sec, log_px, log_qty, log_dir, log_ls = [], [], [], [], []
+        pl_rows = []
+
+        # 先平仓，回收现金
+        for k in np.flatnonzero(close_qty > 0):
+            sec, ls = secs[k], Broker._LS_NAME[side[k]]
+            qty = int(close_qty[k])
+            re_cash_pl, re_cash_cost = self._unclosed[sec].close(close_px[k], qty, ls)
+            self._cash -= comm * abs(close_px[k] * qty)
+            self._cash += re_cash_pl + re_cash_cost
+            pl_rows.append((re_cash_pl, re_cash_cost, re_cash_pl / re_cash_cost, ls))
+            self.stats.add_trade(re_cash_pl / re_cash_cost)
+            log_sec.append(sec)
+            log_px.append(close_px[k])
+            log_qty.append(qty)
+            log_dir.append('close')
+            log_ls.append(ls)
+
+        # 再开仓，资金不足时所有开仓量按同一比例缩减
+        open_cost = (1 + comm) * open_px * open_qty
+        total = open_cost.sum()
+        if total > self._cash:
+            scale = max(self._cash, 0) / total
+            open_qty = np.floor(open_qty * scale)
+            open_cost = (1 + comm) * open_px * open_qty
+        for k in np.flatnonzero(open_qty > 0):
+            sec, ls = secs[k], Broker._LS_NAME[open_side[k]]
+            qty = int(open_qty[k])
+            self._cash -= open_cost[k]
+            self._unclosed[sec].open(open_px[k], qty, ls)
+            log_sec.append(sec)
+            log_px.append(open_px[k])
+            log_qty.append(qty)
+            log_dir.append('open')
+            log_ls.append(ls)
+
+        for sec in set(log_sec):
+            self._sync_position(sec)
+        n = len(log_sec)
+        self._tradelog.extend({'datetime': [self.now] * n, 'security': log_sec,
+                               'price': log_px, 'qty': log_qty,
+                               'direction': log_dir, 'long_short': log_ls})
+        if pl_rows:
+            trade_pl, cost, returns, trade_type = zip(*pl_rows)
+            self._trade_pl.extend({'close_date': [self.now] * len(pl_rows),
+                                   'trade_pl': trade_pl, 'cost': cost,
+                                   'returns': returns, 'trade_type': trade_type})
+
+        change = -side * close_qty + open_side * open_qty
+        return pd.Series(change, index=secs)
+
+    # 挂单
+    # 限价单：买入(多开、空平)在最低价不高于限价时成交，卖出(空开、多平)在最高价不低于限价时成交
+    def order_limit(self, security, limit_price, shares, long_short='long', tif='gtc'):
+        '''
+        param
+        -----
+        security: str; 标的名称
+        limit_price: float; 限价
+        shares: int; 正数为开仓,负数为平仓
+        long_short: str; 'long','short'
+        tif: str; 'gtc'撤单前一直有效，'day'当日收盘后失效(日频数据为下一交易日收盘后)
+
+        return
+        ----
+        int: 挂单编号，可用于cancel_order
+        '''
+        return self._book.submit(security, shares, long_short, 'limit', None,
+                                 limit_price, tif, self.now)
+
+    # 止损单：买入在最高价不低于触发价时、卖出在最低价不高于触发价时按触发价(跳空时按开盘价)加滑点成交
+    def order_stop(self, security, stop_price, shares, long_short='long', tif='gtc'):
+        return self._book.submit(security, shares, long_short, 'stop', stop_price,
+                                 None, tif, self.now)
+
+    # 止损限价单：触发当根bar只按触发价(跳空时按开盘价)或触发后回到的限价成交，不滑点；未成交则自下一根bar起按限价单撮合
+    def order_stop_limit(self, security, stop_price, limit_price, shares,
+                         long_short='long', tif='gtc'):
+        return self._book.submit(security, shares, long_short, 'stop_limit', stop_price,
+                                 limit_price, tif, self.now)
+
+    # 撤销挂单，返回是否撤销成功
+    def cancel_order(self, order_id):
+        return self._book.cancel(order_id)
+
+    # 挂单记录，status为'open'时返回未成交挂单
+    def get_orders(self, status=None):
+        return self._book.to_frame(status)
+
+    # 日内成交委托(需context.intrabar = True，仅日频策略)
+    # VWAP委托：下一交易日按1分钟数据计算的成交量加权均价成交(不另加滑点)，当日无成交时顺延
+    def order_vwap(self, security, shares, long_short='long', start=None, end=None):
+        '''
+        param
+        -----
+        security: str; 标的名称
+        shares: int; 正数为开仓,负数为平仓
+        long_short: str; 'long','short'
+        start: str; 'HH:MM'，成交时段开始时刻，默认为开盘
+        end: str; 'HH:MM'，成交时段结束时刻，默认为收盘
+
+        return
+        ----
+        int: 委托编号，可用于cancel_intrabar_order
+        '''
+        return self._submit_intrabar(security, shares, long_short, 'vwap', start, end)
+
+    # TWAP委托：下一交易日按时段内1分钟收盘价的均值成交
+    def order_twap(self, security, shares, long_short='long', start=None, end=None):
+        return self._submit_intrabar(security, shares, long_short, 'twap', start, end)
+
+    # 撤销未成交的VWAP/TWAP委托，返回是否撤销成功
+    def cancel_intrabar_order(self, order_id):
+        return self._intrabar_simulator().cancel(order_id)
+
+    # VWAP/TWAP委托记录
+    def get_intrabar_orders(self, status=None):
+        return self._intrabar_simulator().to_frame(status)
+
+    def _submit_intrabar(self, security, shares, long_short, kind, start, end):
+        # 未加载交易数据的标的成交后无法估值，下单时即拒绝
+        if security not in self._sec_pos:
+            raise KeyError('no trading data for %s' % security)
+        return self._intrabar_simulator().submit(security, shares, long_short, kind,
+                                                 start, end, self.now)
+
+    def _intrabar_simulator(self):
+        if self._intrabar is None:
+            raise RuntimeError('set context.intrabar = True for a daily strategy')
+        return self._intrabar
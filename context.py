@@ -11,6 +11,18 @@ class Context(object):
         self._slippage = 0.246  # 交易滑点
         self._commision = 0.03  # 交易手续费
         self._minute = None  # 用x分钟数据回测，默认None为日频数据
+        self._data_path = None  # 本地行情数据根目录，默认None为DataHandler中的D:/Data/
+        self._resample = False  # 是否由1分钟数据合成N分钟及日频数据(无需各频率的csv)
+        self._intrabar = False  # 日频策略是否加载1分钟数据模拟VWAP/TWAP及止损的日内成交
+        self._ragged = False  # 是否以非对齐格式保存行情(各标的只保存自身存在的bar，适用于大量标的)
+        self._cache = True  # 是否使用本地行情二进制缓存(首次读取csv后生成)
+        self._load_workers = 8  # 并发读取行情数据的最大线程/进程数
+        self._load_pool = 'thread'  # 并发读取方式, 'thread' or 'process'
+        self._legacy_data = False  # algo是否接收pandas.Panel格式的历史数据（兼容旧策略，较慢）
+        self._profile = False  # 是否统计回测各阶段耗时(Strategy.get_profile获取)
+        self._lookback = None  # algo获取的历史数据长度(bar数)，默认None为全部历史
+        self._indicators = []  # 预先计算的指标，由add_indicator登记
+        self._schedule = []  # algo调度规则，默认为空即每根bar都调用algo
 
         # 用户必须自己定义策略回测标的，起始日期及结束日期
         self._securities = None  # 标的列表（['zz500'],['hs300','600010.sh'])
@@ -37,6 +49,106 @@ class Context(object):
             raise TypeError('minute must be int')
         self._minute = value
 
+    @property
+    def data_path(self):
+        return self._data_path
+
+    @data_path.setter
+    def data_path(self, value):
+        if value is not None and not isinstance(value, str):
+            raise TypeError('data_path must be str')
+        self._data_path = value
+
+    @property
+    def resample(self):
+        return self._resample
+
+    @resample.setter
+    def resample(self, value):
+        if not isinstance(value, bool):
+            raise TypeError('resample must be bool')
+        self._resample = value
+
+    @property
+    def intrabar(self):
+        return self._intrabar
+
+    @intrabar.setter
+    def intrabar(self, value):
+        if not isinstance(value, bool):
+            raise TypeError('intrabar must be bool')
+        self._intrabar = value
+
+    @property
+    def ragged(self):
+        return self._ragged
+
+    @ragged.setter
+    def ragged(self, value):
+        if not isinstance(value, bool):
+            raise TypeError('ragged must be bool')
+        self._ragged = value
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @cache.setter
+    def cache(self, value):
+        if not isinstance(value, bool):
+            raise TypeError('cache must be bool')
+        self._cache = value
+
+    @property
+    def load_workers(self):
+        return self._load_workers
+
+    @load_workers.setter
+    def load_workers(self, value):
+        if not isinstance(value, int) or value < 1:
+            raise TypeError('load_workers must be positive int')
+        self._load_workers = value
+
+    @property
+    def load_pool(self):
+        return self._load_pool
+
+    @load_pool.setter
+    def load_pool(self, value):
+        if value not in ('thread', 'process'):
+            raise ValueError("load_pool must be 'thread' or 'process'")
+        self._load_pool = value
+
+    @property
+    def legacy_data(self):
+        return self._legacy_data
+
+    @legacy_data.setter
+    def legacy_data(self, value):
+        if not isinstance(value, bool):
+            raise TypeError('legacy_data must be bool')
+        self._legacy_data = value
+
+    @property
+    def profile(self):
+        return self._profile
+
+    @profile.setter
+    def profile(self, value):
+        if not isinstance(value, bool):
+            raise TypeError('profile must be bool')
+        self._profile = value
+
+    @property
+    def lookback(self):
+        return self._lookback
+
+    @lookback.setter
+    def lookback(self, value):
+        if value is not None and (not isinstance(value, int) or value < 1):
+            raise TypeError('lookback must be positive int or None')
+        self._lookback = value
+
     @property
     def slippage(self):
         return self._slippage
@@ -88,3 +200,68 @@ class Context(object):
         if not isinstance(securities, list):
             raise TypeError('securities must be list type')
         self._securities = securities
+
+    # 登记的指标列表
+    @property
+    def indicators(self):
+        return list(self._indicators)
+
+    # 登记指标：回测开始前对所有标的一次性计算并缓存，algo中以 data[sec][name][-1] 获取当前值
+    def add_indicator(self, name, func, field='close', outputs=None, **params):
+        '''
+        param name: str, 指标名
+        param func: function, func(x, **params)，x为shape (时间, 标的)的字段数组，
+                    返回同shape的数组；有多个输出时返回数组元组
+        param field: str, 计算所用的行情字段
+        param outputs: list, 多输出指标各输出的名称(如布林带['upper', 'middle', 'lower'])，
+                       默认None为单输出，以name为名称
+        param params: 传给func的参数
+        '''
+        if not callable(func):
+            raise TypeError('func must be callable')
+        outputs = [name] if outputs is None else list(outputs)
+        self._indicators.append(dict(name=name, func=func, field=field,
+                                     outputs=outputs, params=params))
+
+    # algo调度规则，满足任一规则的bar才调用algo；不影响每日收盘后的净值更新
+    @property
+    def schedule(self):
+        return list(self._schedule)
+
+    # 在每日指定时刻调用algo，如 context.schedule_at('09:31', '14:55')
+    def schedule_at(self, *times):
+        '''
+        param times: str('HH:MM') 或 datetime.time
+        '''
+        import datetime
+        minutes = []
+        for t in times:
+            if isinstance(t, str):
+                t = datetime.datetime.strptime(t, '%H:%M').time()
+            if not isinstance(t, datetime.time):
+                raise TypeError('schedule time must be str or datetime.time')
+            minutes.append(t.hour * 60 + t.minute)
+        self._schedule.append(('at', minutes))
+
+    # 自回测起始bar起每n根bar调用一次algo
+    def schedule_every(self, n, offset=0):
+        '''
+        param n: int, 间隔bar数
+        param offset: int, 首次调用距起始bar的bar数(0 <= offset < n)
+        '''
+        if not isinstance(n, int) or n < 1:
+            raise TypeError('n must be positive int')
+        if not isinstance(offset, int) or not 0 <= offset < n:
+            raise ValueError('offset must be int in [0, n)')
+        self._schedule.append(('every', (n, offset)))
+
+    # 在预先计算的布尔序列为True的bar调用algo(如信号变化处)
+    def schedule_on(self, mask):
+        '''
+        param mask: pandas.Series(以时间为索引,缺失的时刻视为False) 或
+                    与行情时间轴等长的布尔数组
+        '''
+        self._schedule.append(('on', mask))
+
+    def clear_schedule(self):
+        self._schedule = []
@@ -0,0 +1,232 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import os
+import json
+import numpy as np
+import pandas as pd
+
+
+# 本地行情列式二进制缓存
+# csv首次读取后转换为: date.bin(int64纳秒时间戳) + values.bin(float64, 按列连续存储)
+# 之后以np.memmap映射读取，按源文件的修改时间及大小判断缓存是否失效
+class BarCache(object):
+
+    _META = 'meta.json'
+    _DATES = 'date.bin'
+    _VALUES = 'values.bin'
+
+    def __init__(self, path, transform=None):
+        '''
+        param path: 单个标的的缓存目录
+        param transform: function, 写入缓存前对csv数据的转换(如由1分钟数据合成N分钟数据)
+        '''
+        self._path = path
+        self._transform = transform
+
+    # 读取缓存(失效则由csv重建)，返回时间戳数组、字段数据数组、字段名
+    def load(self, csv_file):
+        '''
+        param csv_file: 源csv文件
+
+        return
+        -------
+        dates: numpy.memmap int64, shape (n,)
+        values: numpy.memmap float64, shape (字段数, n)
+        fields: 字段名列表
+        '''
+        meta = self._read_meta()
+        if meta is None or not self._is_valid(meta, csv_file):
+            dates, values, fields = self._parse(csv_file)
+            try:
+                meta = self._build(csv_file, dates, values, fields)
+            except (IOError, OSError):
+                # 缓存目录不可写(如只读的共享数据目录)时直接使用解析的csv数据
+                return dates, values, fields
+
+        n = meta['rows']
+        fields = meta['fields']
+        if n == 0:  # 空文件无法映射
+            return np.empty(0, np.int64), np.empty((len(fields), 0)), fields
+
+        dates = np.memmap(self._file(self._DATES), dtype=np.int64,
+                          mode='r', shape=(n,))
+        values = np.memmap(self._file(self._VALUES), dtype=np.float64,
+                           mode='r', shape=(len(fields), n))
+        return dates, values, fields
+
+    # 取start至end(含当日)的数据，二分查找定位后返回零拷贝视图构成的DataFrame
+    def fetch(self, csv_file, start, end):
+        '''
+        param start: str, 'xxxx-xx-xx'
+        param end: str, 'xxxx-xx-xx'
+        '''
+        dates, values, fields = self.load(csv_file)
+        lo = np.searchsorted(dates, pd.Timestamp(start).value, 'left')
+        hi = np.searchsorted(
+            dates, (pd.Timestamp(end) + pd.Timedelta(days=1)).value, 'left')
+        idx = pd.DatetimeIndex(dates[lo:hi].view('datetime64[ns]'))
+        df = pd.DataFrame(values[:, lo:hi].T, index=idx, columns=fields)
+        df.index.name = 'date'
+        return df
+
+    def _file(self, name):
+        return os.path.join(self._path, name)
+
+    def _read_meta(self):
+        try:
+            with open(self._file(self._META)) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _is_valid(meta, csv_file):
+        st = os.stat(csv_file)
+        return meta.get('mtime') == st.st_mtime and meta.get('size') == st.st_size
+
+    # 解析csv(经transform转换)，返回同load的时间戳数组、字段数据数组、字段名
+    def _parse(self, csv_file):
+        df = pd.read_csv(csv_file, index_col=0, parse_dates=True)
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index(kind='mergesort')
+        if self._transform is not None:
+            df = self._transform(df)
+
+        dates = np.ascontiguousarray(
+            df.index.values.astype('datetime64[ns]').view(np.int64))
+        values = np.ascontiguousarray(df.values.astype(np.float64).T)
+        return dates, values, [str(c) for c in df.columns]
+
+    # 写入缓存，先写临时文件再替换，避免读取到写了一半的缓存
+    def _build(self, csv_file, dates, values, fields):
+        st = os.stat(csv_file)
+        if not os.path.exists(self._path):
+            os.makedirs(self._path)
+        meta = {'mtime': st.st_mtime, 'size': st.st_size,
+                'rows': len(dates), 'fields': fields}
+        for name, arr in ((self._DATES, dates), (self._VALUES, values)):
+            tmp = self._file(name + '.tmp')
+            arr.tofile(tmp)
+            os.replace(tmp, self._file(name))
+        tmp = self._file(self._META + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._file(self._META))
+        return meta
+
+
+# csv日期索引：记录每个交易日首行在csv文件中的字节偏移，读取时只解析所需日期区间的行
+# 索引文件与BarCache同目录，按源文件的修改时间及大小判断是否失效
+class CsvIndex(object):
+
+    _META = 'csvindex.json'
+    _OFFSETS = 'offsets.bin'
+
+    def __init__(self, path):
+        '''
+        param path: 单个标的的索引目录
+        '''
+        self._path = path
+
+    # 读取start至end(含当日)的数据，同 pd.read_csv(csv_file, index_col=0, parse_dates=True).ix[start:end]
+    def fetch(self, csv_file, start, end):
+        '''
+        param start: str, 'xxxx-xx-xx'
+        param end: str, 'xxxx-xx-xx'
+        '''
+        meta, days, offsets = self.load(csv_file)
+        if not meta['sorted']:  # 日期无序时无法按区间定位
+            df = pd.read_csv(csv_file, index_col=0, parse_dates=True)
+            return df.sort_index(kind='mergesort').ix[start:end]
+
+        lo = np.searchsorted(days, pd.Timestamp(start).value, 'left')
+        hi = np.searchsorted(
+            days, (pd.Timestamp(end) + pd.Timedelta(days=1)).value, 'left')
+        begin = offsets[lo] if lo < len(days) else meta['size']
+        stop = offsets[hi] if hi < len(days) else meta['size']
+        empty = begin == stop and len(days) > 0
+        with open(csv_file, 'rb') as f:
+            if empty:  # 区间内无数据时读取首行以得到与read_csv一致的索引及列类型
+                f.seek(offsets[0])
+                chunk = f.readline()
+            else:
+                f.seek(begin)
+                chunk = f.read(stop - begin)
+        import io
+        text = meta['header'].encode('utf-8') + chunk
+        df = pd.read_csv(io.BytesIO(text), index_col=0, parse_dates=True)
+        return df.iloc[:0] if empty else df
+
+    # 读取索引(失效则重建)，返回元信息、每个交易日的时间戳及其首行字节偏移
+    def load(self, csv_file):
+        meta = self._read_meta()
+        if meta is None or not BarCache._is_valid(meta, csv_file):
+            meta, days, offsets = self._scan(csv_file)
+            try:
+                self._build(meta, days, offsets)
+            except (IOError, OSError):
+                # 索引目录不可写时只在本次读取中使用
+                return meta, days, offsets
+        n = meta['days']
+        if n == 0:
+            return meta, np.empty(0, np.int64), np.empty(0, np.int64)
+        arr = np.fromfile(self._file(self._OFFSETS), dtype=np.int64).reshape(2, n)
+        return meta, arr[0], arr[1]
+
+    def _file(self, name):
+        return os.path.join(self._path, name)
+
+    def _read_meta(self):
+        try:
+            with open(self._file(self._META)) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    # 扫描换行符定位每行起始，按行首日期(首个空格、逗号或T之前的部分)变化处划分交易日
+    def _scan(self, csv_file):
+        st = os.stat(csv_file)
+        buf = np.fromfile(csv_file, dtype=np.uint8)
+        size = len(buf)
+        starts = np.flatnonzero(buf == ord('\n')) + 1
+        header_end = starts[0] if len(starts) else size
+        header = buf[:header_end].tobytes().decode('utf-8')
+        if header and not header.endswith('\n'):
+            header += '\n'
+        starts = starts[starts < size]
+
+        width = 10
+        pos = np.minimum(starts[:, None] + np.arange(width), size - 1)
+        prefix = buf[pos]
+        # 行首日期之后的字节置0
+        stop = (prefix == ord(' ')) | (prefix == ord(',')) | (prefix == ord('T')) | \
+            (prefix == ord('\r')) | (prefix == ord('\n'))
+        prefix[np.logical_or.accumulate(stop, axis=1)] = 0
+        if len(starts):
+            changed = np.ones(len(starts), dtype=bool)
+            changed[1:] = (prefix[1:] != prefix[:-1]).any(axis=1)
+            starts, prefix = starts[changed], prefix[changed]
+        tokens = [p.tobytes().rstrip(b'\x00').decode('ascii') for p in prefix]
+        tokens_ok = [t for t in tokens if t]
+        days = pd.to_datetime(tokens_ok).values.astype('datetime64[ns]').view(np.int64)
+        offsets = starts[[bool(t) for t in tokens]].astype(np.int64)
+
+        # 日期无序(或同一日期不连续出现)时退化为整文件读取
+        is_sorted = bool(np.all(np.diff(days) > 0))
+        meta = {'mtime': st.st_mtime, 'size': size, 'days': len(days),
+                'sorted': is_sorted, 'header': header}
+        return meta, days, offsets
+
+    # 写入索引文件
+    def _build(self, meta, days, offsets):
+        if not os.path.exists(self._path):
+            os.makedirs(self._path)
+        tmp = self._file(self._OFFSETS + '.tmp')
+        np.ascontiguousarray(np.vstack([days, offsets])).tofile(tmp)
+        os.replace(tmp, self._file(self._OFFSETS))
+        tmp = self._file(self._META + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._file(self._META))
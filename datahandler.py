@@ -2,17 +2,37 @@
 
 __author__ = 'wulinkai'
 
+from functools import partial
+from .datacache import BarCache, CsvIndex
+from .resample import resample_bars
+from .universe import Universe
+from .execution import IntradayBars
+
+
+# 读取单只标的数据并计时，供线程池/进程池调用(进程池要求为模块级函数)
+def _timed_fetch(handler, security):
+    import time
+    t0 = time.time()
+    try:
+        df = handler._fetch_sigle_data(security)
+        return security, df, time.time() - t0, None
+    except Exception as e:
+        return security, None, time.time() - t0, repr(e)
+
 
 # 获取交易数据类
 class DataHandler(object):
 
     import pandas as pd
+    import numpy as np
     import datetime
     import os
 
     # 本地交易数据文件地址,包含分钟数据和日频数据
     _DAILY_DATA = "D:/Data/Daily/"
     _MINUTE_DATA = "D:/Data/Minute/"
+    # 二进制缓存地址，目录结构同上: D:/Data/Cache/Daily/xxxx/, D:/Data/Cache/Minute/X/xxxx/
+    _CACHE_DATA = "D:/Data/Cache/"
 
     def __init__(self, context):
         '''
@@ -26,17 +46,106 @@ class DataHandler(object):
         # list. example: ['600010.SH'], ['zz500','hs300','300010.sz']
         self._secs = context.securities
         self._minute = context.minute  # int or None
+        self._cache = context.cache  # bool, 是否使用二进制缓存
+        self._resample = context.resample  # bool, 是否由1分钟数据合成所需频率的数据
+        self._ragged = context.ragged  # bool, 是否返回非对齐的Universe
+        self._workers = context.load_workers  # int, 并发读取的最大线程/进程数
+        self._pool = context.load_pool  # str, 'thread' or 'process'
+        # 指定数据根目录时，日频、分钟及缓存数据位于其下的Daily/、Minute/、Cache/
+        if context.data_path is not None:
+            root = context.data_path.rstrip('/\\') + '/'
+            self._DAILY_DATA = root + 'Daily/'
+            self._MINUTE_DATA = root + 'Minute/'
+            self._CACHE_DATA = root + 'Cache/'
+
+        # pandas.DataFrame;每个标的的读取耗时、行数及错误信息(fetch_data后生成)
+        self.load_report = None
 
     # 获取所有订阅标的交易数据
     def fetch_data(self):
         '''
-        return: trading datas,pandas Panel
+        return: trading datas,pandas Panel (context.ragged为True时为Universe)
+        '''
+        datas = self._fetch_all()
+        if len(datas) == 0:
+            raise IOError('no trading data loaded')
+        if self._ragged:
+            return Universe.from_frames(datas)
+        return self._align(datas)
+
+    # 获取所有订阅标的的1分钟数据，按交易日建立索引，供日频策略模拟日内成交
+    def fetch_intraday(self):
+        '''
+        return: dict, key为标的名，value为IntradayBars；读取失败的标的不包含在内
         '''
+        bars = dict()
+        for security in self._secs:
+            try:
+                bars[security] = self._intraday_bars(security)
+            except Exception as e:
+                print("fail to load minute data", security, repr(e))
+        return bars
+
+    # 单只标的的1分钟数据，始终经BarCache以memmap读取(不复制数据)
+    def _intraday_bars(self, security):
+        np = self.np
+        name = security.upper()
+        file_ = self._MINUTE_DATA + "1/" + name + ".csv"
+        if not self.os.path.exists(file_):
+            raise IOError('no local csv file')
+        dates, values, fields = BarCache(self._CACHE_DATA + "Minute/1/" + name).load(file_)
+        lo = np.searchsorted(dates, self.pd.Timestamp(self._start).value, 'left')
+        hi = np.searchsorted(
+            dates, (self.pd.Timestamp(self._end) + self.pd.Timedelta(days=1)).value, 'left')
+        return IntradayBars(dates[lo:hi], values[:, lo:hi], fields)
+
+    # 并发读取所有标的，单个标的失败不影响其它标的，结果记录于load_report
+    def _fetch_all(self):
+        secs = self._secs
+        workers = max(1, min(self._workers, len(secs)))
+        if workers == 1:
+            results = [_timed_fetch(self, sec) for sec in secs]
+        else:
+            from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+            executor = ProcessPoolExecutor if self._pool == 'process' else ThreadPoolExecutor
+            with executor(max_workers=workers) as ex:
+                results = list(ex.map(_timed_fetch, [self] * len(secs), secs))
+
         datas = dict()
-        for sec in self._secs:
-            df = self._fetch_sigle_data(sec)
-            datas[sec] = df
-        return self.pd.Panel(datas)
+        report = []
+        for sec, df, seconds, error in results:
+            if error is None:
+                datas[sec] = df
+            else:
+                print("fail to load data", sec, error)
+            report.append({'security': sec, 'seconds': seconds,
+                           'rows': 0 if df is None else len(df), 'error': error})
+        self.load_report = self.pd.DataFrame(
+            report, columns=['security', 'seconds', 'rows', 'error']).set_index('security')
+        return datas
+
+    # 将各标的数据按时间并集对齐为pandas.Panel，一次性写入三维数组
+    def _align(self, datas):
+        '''
+        param datas: dict, key为标的名，value为pandas.DataFrame
+        '''
+        np = self.np
+        secs = sorted(datas)
+        fields = list(datas[secs[0]].columns)
+        if any(list(datas[sec].columns) != fields for sec in secs):
+            fields = sorted(set().union(*[datas[sec].columns for sec in secs]))
+
+        stamps = [datas[sec].index.values.astype('datetime64[ns]').view(np.int64)
+                  for sec in secs]
+        major = np.unique(np.concatenate(stamps))
+
+        values = np.full((len(secs), len(major), len(fields)), np.nan)
+        for i, sec in enumerate(secs):
+            df = datas[sec].reindex(columns=fields)
+            values[i, np.searchsorted(major, stamps[i]), :] = df.values
+
+        major = self.pd.DatetimeIndex(major.view('datetime64[ns]'))
+        return self.pd.Panel(values, items=secs, major_axis=major, minor_axis=fields)
 
     # 订阅单只标的的数据
     def _fetch_sigle_data(self, security):
@@ -44,14 +153,29 @@ class DataHandler(object):
         return: trading data,pandas DataFrame timeseries
         '''
         security = security.upper()
-        if self._minute is None:
+        transform = None
+        if self._resample and self._minute != 1:
+            # 由1分钟数据合成，合成结果缓存于 Cache/Resampled/Daily/ 或 Cache/Resampled/X/
+            sub = "Minute/1/"
+            file_ = self._MINUTE_DATA + "1/" + security + ".csv"
+            transform = partial(resample_bars, minute=self._minute)
+            freq = "Daily/" if self._minute is None else str(self._minute) + "/"
+            cache_sub = "Resampled/" + freq
+        elif self._minute is None:
+            sub = cache_sub = "Daily/"
             file_ = self._DAILY_DATA + security + ".csv"
         else:
+            sub = cache_sub = "Minute/" + str(self._minute) + "/"
             file_ = self._MINUTE_DATA + \
                 str(self._minute) + "/" + security + ".csv"
 
         if not self.os.path.exists(file_):
             raise IOError('no local csv file')
+        elif self._cache:
+            cache = BarCache(self._CACHE_DATA + cache_sub + security, transform)
+            return cache.fetch(file_, self._start, self._end)
         else:
-            df = self.pd.read_csv(file_, index_col=0, parse_dates=True)
-            return df.ix[self._start:self._end]
+            # 按日期索引只解析所需区间的行
+            index = CsvIndex(self._CACHE_DATA + sub + security)
+            df = index.fetch(file_, self._start, self._end)
+            return df if transform is None else transform(df)
@@ -0,0 +1,123 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import numpy as np
+import pandas as pd
+
+#####################################################################
+# 滚动最大回撤/最大涨幅
+#   区间[i..j]的最大回撤 = max(1 - p[j] / max(p[i..j]))
+#   区间[i..j]的最大涨幅 = max(p[j] / min(p[i..j]) - 1)
+#   两者都可由区间的(先出现的极值, 后出现的极值, 区间结果)三元组拼接得到：
+#   A在B之前时, AB的结果 = max(A结果, B结果, g(B的后极值, A的先极值))
+#   按窗口长度W分块，块内前缀与后缀各做一次累积，任意窗口 = 前一块的后缀 + 后一块的前缀，
+#   总计算量O(N)，与窗口长度无关
+
+
+# 最大回撤：先极值为最高价，后极值为最低价
+def _dd_gap(later, earlier):
+    return 1 - later / earlier
+
+
+# 最大涨幅：先极值为最低价，后极值为最高价
+def _ru_gap(later, earlier):
+    return later / earlier - 1
+
+
+def _reverse_accumulate(ufunc, x):
+    return ufunc.accumulate(x[:, ::-1], axis=1)[:, ::-1]
+
+
+def rolling_extreme(values, window, runup=False):
+    '''
+    param values: numpy.ndarray, shape (T,) 或 (T, K)，按列分别计算
+    param window: int, 窗口长度
+    param runup: bool, False为最大回撤，True为最大涨幅
+
+    return: numpy.ndarray, 与values同shape，第t行为以t结尾的窗口的结果，前window-1行为NaN
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    n = values.shape[0]
+    out = np.full(values.shape, np.nan)
+    if window < 1 or n < window:
+        return out
+
+    if runup:
+        early, late, gap = np.minimum, np.maximum, _ru_gap
+    else:
+        early, late, gap = np.maximum, np.minimum, _dd_gap
+
+    # 补齐为window的整数倍，按块重排为(块数, window, ...)
+    blocks = -(-n // window)
+    pad = blocks * window - n
+    if pad:
+        values = np.concatenate([values, np.repeat(values[-1:], pad, axis=0)])
+    x = values.reshape((blocks, window) + values.shape[1:])
+
+    # 块内前缀：先极值、后极值、前缀结果
+    pre_e = early.accumulate(x, axis=1)
+    pre_l = late.accumulate(x, axis=1)
+    pre_m = np.maximum.accumulate(gap(x, pre_e), axis=1)
+    # 块内后缀：先极值、后极值、后缀结果
+    suf_e = _reverse_accumulate(early, x)
+    suf_l = _reverse_accumulate(late, x)
+    suf_m = _reverse_accumulate(np.maximum, gap(suf_l, x))
+
+    shape = (blocks * window,) + values.shape[1:]
+    pre_l, pre_m = pre_l.reshape(shape), pre_m.reshape(shape)
+    suf_e, suf_m = suf_e.reshape(shape), suf_m.reshape(shape)
+
+    # 以e结尾的窗口起点s=e-window+1；s为块首时窗口即整块，否则跨两块拼接
+    s = np.arange(n - window + 1)
+    e = s + window - 1
+    res = np.maximum(np.maximum(suf_m[s], pre_m[e]), gap(pre_l[e], suf_e[s]))
+    aligned = (s % window) == 0
+    res[aligned] = pre_m[e[aligned]]
+    out[window - 1:] = res
+    return out
+
+
+def _rolling(pl, windows, runup):
+    single = np.isscalar(windows)
+    windows = [windows] if single else list(windows)
+
+    if isinstance(pl, (pd.Series, pd.DataFrame)):
+        values = pl.values
+        res = {w: rolling_extreme(values, w, runup) for w in windows}
+        if isinstance(pl, pd.Series):
+            res = {w: pd.Series(v, index=pl.index, name=pl.name)
+                   for w, v in res.items()}
+            if not single:
+                return pd.DataFrame(res, columns=windows)
+        else:
+            res = {w: pd.DataFrame(v, index=pl.index, columns=pl.columns)
+                   for w, v in res.items()}
+    else:
+        res = {w: rolling_extreme(pl, w, runup) for w in windows}
+    return res[windows[0]] if single else res
+
+
+def rolling_max_drawdown(pl, windows):
+    '''
+    滚动窗口最大回撤，同 pd.rolling_apply(pl, w, lambda x: np.max(1 - x / pd.expanding_max(x)))
+
+    param pl: pandas.Series/DataFrame 或 numpy.ndarray, 净值或价格序列
+    param windows: int 或 int列表, 窗口长度
+
+    return
+    -------
+    windows为int时: 与pl同类型，窗口不足处为NaN
+    windows为列表时: pl为Series返回DataFrame(列为各窗口长度)，否则返回dict(窗口长度: 结果)
+    '''
+    return _rolling(pl, windows, runup=False)
+
+
+def rolling_max_runup(pl, windows):
+    '''
+    滚动窗口最大涨幅，同 pd.rolling_apply(pl, w, lambda x: np.max(x / pd.expanding_min(x) - 1))
+
+    param pl: pandas.Series/DataFrame 或 numpy.ndarray, 净值或价格序列
+    param windows: int 或 int列表, 窗口长度
+    '''
+    return _rolling(pl, windows, runup=True)
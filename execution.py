@@ -0,0 +1,219 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import itertools
+import numpy as np
+import pandas as pd
+
+from .resample import _minute_of_day, _NS_PER_MINUTE
+
+#####################################################################
+# 日频策略的日内成交模拟：由1分钟数据(BarCache的memmap缓存)计算VWAP、TWAP成交价
+# 及止损价在日内首次被触及的时刻与成交价。
+# 每个标的的1分钟数据按交易日预先建立偏移数组，某日的数据即为values[:, offsets[d]:offsets[d+1]]，
+# 取某日成交价时只对该日的数据块做向量化计算，不复制、不重新读取文件
+
+_NS_PER_DAY = 24 * 3600 * 10 ** 9
+
+
+# 单个标的按交易日索引的1分钟数据
+class IntradayBars(object):
+
+    def __init__(self, dates, values, fields):
+        '''
+        param dates: numpy.ndarray(可为memmap) int64, 递增的1分钟bar纳秒时间戳
+        param values: numpy.ndarray(可为memmap) float64, shape (字段数, bar数)
+        param fields: 字段名列表，含open,high,low,close,volume，可含amount
+        '''
+        self._dates = dates
+        self._values = values
+        self._field_pos = {f: i for i, f in enumerate(fields)}
+        days = dates - dates % _NS_PER_DAY
+        starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]]) if len(days) else \
+            np.empty(0, dtype=np.int64)
+        self._days = np.ascontiguousarray(days[starts])  # 各交易日00:00的纳秒时间戳
+        self._offsets = np.append(starts, len(dates)).astype(np.int64)
+
+    @property
+    def days(self):
+        return pd.DatetimeIndex(self._days.view('datetime64[ns]'))
+
+    def _field(self, field, lo, hi):
+        return self._values[self._field_pos[field], lo:hi]
+
+    # 某交易日[start, end]时段内的bar区间，无数据时返回None
+    def _block(self, day, start=None, end=None):
+        '''
+        param day: 交易日(可为当日任意时刻)
+        param start: str, 'HH:MM'，时段开始时刻(不含该时刻结束的bar)，默认为开盘
+        param end: str, 'HH:MM'，时段结束时刻(含)，默认为收盘
+        '''
+        key = pd.Timestamp(day).normalize().value
+        d = np.searchsorted(self._days, key)
+        if d == len(self._days) or self._days[d] != key:
+            return None
+        lo, hi = self._offsets[d], self._offsets[d + 1]
+        if start is not None or end is not None:
+            # 分钟bar的时间戳为bar的结束时刻
+            dates = self._dates[lo:hi]
+            first = 0 if start is None else np.searchsorted(
+                dates, key + _minute_of_day(start) * _NS_PER_MINUTE, 'right')
+            last = len(dates) if end is None else np.searchsorted(
+                dates, key + _minute_of_day(end) * _NS_PER_MINUTE, 'right')
+            lo, hi = lo + first, lo + last
+        return (lo, hi) if hi > lo else None
+
+    # 成交量加权均价：有成交额时为成交额/成交量，否则以收盘价按成交量加权；无成交时为NaN
+    def vwap(self, day, start=None, end=None):
+        block = self._block(day, start, end)
+        if block is None:
+            return np.nan
+        volume = np.nan_to_num(self._field('volume', *block))
+        total = volume.sum()
+        if not total > 0:
+            return np.nan
+        if 'amount' in self._field_pos:
+            return np.nan_to_num(self._field('amount', *block)).sum() / total
+        return np.nansum(self._field('close', *block) * volume) / total
+
+    # 时间加权均价：时段内各bar收盘价的均值
+    def twap(self, day, start=None, end=None):
+        block = self._block(day, start, end)
+        if block is None:
+            return np.nan
+        close = self._field('close', *block)
+        return np.nanmean(close) if np.isfinite(close).any() else np.nan
+
+    # 止损价在某交易日首次被触及的bar，返回(时间戳, 成交价)，未触及时返回None
+    # 买入止损: 最高价 >= 触发价，成交价max(开盘价, 触发价)；卖出止损: 最低价 <= 触发价，成交价min(开盘价, 触发价)
+    def first_touch(self, day, stop, buy, start=None, end=None):
+        block = self._block(day, start, end)
+        if block is None:
+            return None
+        if buy:
+            hit = np.flatnonzero(self._field('high', *block) >= stop)
+        else:
+            hit = np.flatnonzero(self._field('low', *block) <= stop)
+        if len(hit) == 0:
+            return None
+        k = block[0] + hit[0]
+        open_ = self._values[self._field_pos['open'], k] if 'open' in self._field_pos else np.nan
+        price = max(open_, stop) if buy else min(open_, stop)
+        return (pd.Timestamp(int(self._dates[k])), stop if np.isnan(price) else price)
+
+    # 所有交易日的VWAP，pandas.Series，一次reduceat计算
+    def daily_vwap(self):
+        starts = self._offsets[:-1]
+        if len(starts) == 0:
+            return pd.Series([], index=self.days, dtype=np.float64)
+        volume = np.nan_to_num(self._values[self._field_pos['volume']])
+        if 'amount' in self._field_pos:
+            amount = np.nan_to_num(self._values[self._field_pos['amount']])
+        else:
+            amount = np.nan_to_num(self._values[self._field_pos['close']]) * volume
+        total = np.add.reduceat(volume, starts)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            res = np.where(total > 0, np.add.reduceat(amount, starts) / total, np.nan)
+        return pd.Series(res, index=self.days)
+
+
+# 日内成交模拟器：VWAP/TWAP委托在下单后的下一交易日按该日(或指定时段)的1分钟数据成交，
+# 止损挂单按1分钟数据确定日内首次触及的成交价
+class ExecutionSimulator(object):
+
+    _COLUMNS = ['security', 'shares', 'long_short', 'kind', 'start', 'end',
+                'created', 'status', 'filled_at', 'fill_price']
+
+    def __init__(self, bars):
+        '''
+        param bars: dict, key为标的名，value为IntradayBars
+        '''
+        self._bars = bars
+        self._orders = []  # 所有委托，每个委托为dict
+        self._pending = []  # 未成交委托
+        self._ids = itertools.count()
+
+    # 序列化时不保存行情数据(断点续跑时由set_bars重新绑定)
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_bars'] = None
+        state['_ids'] = next(self._ids)
+        return state
+
+    def __setstate__(self, state):
+        state['_ids'] = itertools.count(state['_ids'])
+        self.__dict__.update(state)
+
+    def set_bars(self, bars):
+        self._bars = bars
+
+    def __getitem__(self, security):
+        return self._bars[security]
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def submit(self, security, shares, long_short, kind, start, end, now):
+        if security not in self._bars:
+            raise KeyError('no minute data for %s' % security)
+        if shares == 0:
+            raise ValueError('shares must not be 0')
+        if long_short not in ('long', 'short'):
+            raise ValueError("long_short must be 'long' or 'short'")
+        order = {'id': next(self._ids), 'security': security, 'shares': shares,
+                 'long_short': long_short, 'kind': kind, 'start': start, 'end': end,
+                 'created': now, 'status': 'open', 'filled_at': None, 'fill_price': None}
+        self._orders.append(order)
+        self._pending.append(order)
+        return order['id']
+
+    def cancel(self, order_id):
+        for order in self._pending:
+            if order['id'] == order_id:
+                order['status'] = 'cancelled'
+                self._pending.remove(order)
+                return True
+        return False
+
+    # 按broker.now所在交易日的VWAP/TWAP成交此前提交的委托；当日无成交(如停牌)的委托顺延
+    def execute(self, broker):
+        waiting = []
+        for order in self._pending:
+            if order['created'] is not None and order['created'] >= broker.now:
+                waiting.append(order)
+                continue
+            bars = self._bars[order['security']]
+            if order['kind'] == 'vwap':
+                price = bars.vwap(broker.now, order['start'], order['end'])
+            else:
+                price = bars.twap(broker.now, order['start'], order['end'])
+            if np.isnan(price):
+                waiting.append(order)
+                continue
+            ok = broker.order_share(order['security'], price, order['shares'],
+                                    order['long_short'], real_price=True)
+            order['status'] = 'filled' if ok else 'rejected'
+            if ok:
+                order['filled_at'] = broker.now
+                order['fill_price'] = price
+        self._pending = waiting
+
+    # 止损单在某交易日的日内成交价，无该标的分钟数据或未触及时返回None
+    def stop_price(self, security, day, stop, buy):
+        bars = self._bars.get(security) if self._bars is not None else None
+        if bars is None:
+            return None
+        touch = bars.first_touch(day, stop, buy)
+        return None if touch is None else touch[1]
+
+    # 委托记录
+    def to_frame(self, status=None):
+        orders = self._orders if status is None else \
+            [o for o in self._orders if o['status'] == status]
+        frame = pd.DataFrame([[o[c] for c in ExecutionSimulator._COLUMNS] for o in orders],
+                             index=[o['id'] for o in orders],
+                             columns=ExecutionSimulator._COLUMNS)
+        frame.index.name = 'order_id'
+        return frame
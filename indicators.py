@@ -0,0 +1,101 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import hashlib
+from collections import OrderedDict
+import numpy as np
+
+#####################################################################
+# 指标缓存：指标在回测开始前对所有标的一次性向量化计算，结果(所有标的的指标矩阵)按
+# (指标名, 函数, 字段, 参数, 标的, 数据指纹) 缓存于进程内，按LRU淘汰；
+# 参数扫描等重复回测中相同数据、相同参数的指标不再重复计算
+
+_CACHE = OrderedDict()
+_CACHE_SIZE = 256  # 最多缓存的指标结果数(每个结果含所有标的)
+
+
+def set_cache_size(size):
+    global _CACHE_SIZE
+    if not isinstance(size, int) or size < 0:
+        raise TypeError('size must be non-negative int')
+    _CACHE_SIZE = size
+    _evict()
+
+
+def clear_cache():
+    _CACHE.clear()
+
+
+def _evict():
+    while len(_CACHE) > _CACHE_SIZE:
+        _CACHE.popitem(last=False)
+
+
+# 数据指纹(时间轴、数值等数组)
+def _fingerprint(*arrays):
+    h = hashlib.md5()
+    for arr in arrays:
+        h.update(np.ascontiguousarray(arr).tobytes())
+    return h.hexdigest()
+
+
+def _outputs(res, names, n_secs, length):
+    if len(names) == 1:
+        res = (res,)
+    if len(res) != len(names):
+        raise ValueError('indicator returned %d outputs, expected %d' % (len(res), len(names)))
+    outs = []
+    for r in res:
+        r = np.asarray(r, dtype=np.float64)
+        if r.shape != (length, n_secs):
+            raise ValueError('indicator output shape %s, expected %s' % (r.shape, (length, n_secs)))
+        outs.append(r)
+    return outs
+
+
+def evaluate(bars, spec):
+    '''
+    param bars: BarData, 回测行情数据
+    param spec: dict, Context.add_indicator 登记的指标(name, func, field, outputs, params)
+
+    return: dict, key为输出名, value为shape (标的数, 时间长度)的只读数组
+            (RaggedBarData时为shape (总bar数,)，与各标的自身的bar一一对应)
+    '''
+    func, field, params = spec['func'], spec['field'], spec['params']
+    fpos = bars._field_pos[field]
+    if bars.ragged:
+        values = bars._values[:, fpos]
+        data = _fingerprint(bars._index.asi8[bars._rows], bars._offsets, values)
+    else:
+        values = bars._values[:, :, fpos]  # (标的, 时间)
+        data = _fingerprint(bars._index.asi8, values)
+    key = (spec['name'], func, field, repr(sorted(params.items())), tuple(bars.items), data)
+
+    cached = _CACHE.get(key)
+    if cached is None:
+        compute = _compute_ragged if bars.ragged else _compute
+        cached = compute(bars, values, func, params, spec['outputs'])
+        for arr in cached:
+            arr.flags.writeable = False
+        _CACHE[key] = cached
+    _CACHE.move_to_end(key)
+    _evict()
+    return dict(zip(spec['outputs'], cached))
+
+
+# 对所有标的一次性计算，输入为(时间, 标的)数组
+def _compute(bars, values, func, params, names):
+    res = func(values.T.copy(), **params)
+    return [np.ascontiguousarray(o.T) for o in _outputs(res, names, *values.shape)]
+
+
+# 非对齐行情(RaggedBarData)：各标的长度不同，逐个标的以(时间, 1)数组计算
+def _compute_ragged(bars, values, func, params, names):
+    outs = [np.empty(len(values)) for _ in names]
+    for i in range(len(bars.items)):
+        lo, hi = bars._offsets[i], bars._offsets[i + 1]
+        res = func(values[lo:hi, None].copy(), **params)
+        for out, o in zip(outs, _outputs(res, names, 1, hi - lo)):
+            out[lo:hi] = o[:, 0]
+    return outs
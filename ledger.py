@@ -0,0 +1,91 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+from collections import deque
+import pandas as pd
+
+
+# 单笔未平仓记录
+class Lot(object):
+
+    __slots__ = ('price', 'open_qty', 'long_short', 'cost')
+
+    def __init__(self, price, open_qty, long_short):
+        self.price = price  # 开仓价
+        self.open_qty = open_qty  # 未平仓量
+        self.long_short = long_short  # 多、空
+        self.cost = open_qty * price  # 未平仓成本
+
+
+# 单标的未平仓账本：按开仓先后排列的Lot队列，先开先平(FIFO)
+# 同时维护未平仓量、未平仓成本的累计值，持仓量、方向查询为O(1)
+class LotLedger(object):
+
+    __slots__ = ('_lots', 'qty', 'cost', 'long_short')
+
+    _COLUMNS = ['price', 'open_qty', 'long_short', 'cost']
+
+    def __init__(self):
+        self._lots = deque()
+        self.qty = 0  # 未平仓总量
+        self.cost = 0.0  # 未平仓总成本
+        self.long_short = None  # 持仓方向，无持仓时为None
+
+    def __len__(self):
+        return len(self._lots)
+
+    def __iter__(self):
+        return iter(self._lots)
+
+    # 开仓：队尾添加一笔未平仓记录
+    def open(self, price, open_qty, long_short):
+        lot = Lot(price, open_qty, long_short)
+        self._lots.append(lot)
+        self.qty += open_qty
+        self.cost += lot.cost
+        self.long_short = long_short
+
+    # 平仓：从队首起依次平掉close_qty，返回(平仓盈亏, 平掉部分的开仓成本)
+    def close(self, close_price, close_qty, long_short):
+        lots = self._lots
+        re_cash_pl = 0  # 返回的盈亏
+        re_cash_cost = 0  # 返回的成本
+
+        while lots:
+            lot = lots[0]
+            vol_i = lot.open_qty
+            price_i = lot.price
+            price_diff = close_price - price_i
+            if vol_i < close_qty:
+                re_cash_pl += vol_i * price_diff if long_short == 'long' else vol_i * -price_diff
+                re_cash_cost += vol_i * price_i
+                close_qty -= vol_i
+                self.qty -= vol_i
+                self.cost -= lot.cost
+                lots.popleft()
+            else:
+                re_cash_pl += close_qty * \
+                    price_diff if long_short == 'long' else close_qty * -price_diff
+                re_cash_cost += close_qty * price_i
+                self.qty -= close_qty
+                self.cost -= lot.cost
+                lot.open_qty = vol_i - close_qty
+                lot.cost = (vol_i - close_qty) * price_i
+                self.cost += lot.cost
+                if lot.open_qty == 0:
+                    lots.popleft()
+                break
+
+        # 全部平仓后清零，避免浮点累计误差
+        if not lots:
+            self.qty = 0
+            self.cost = 0.0
+            self.long_short = None
+        return re_cash_pl, re_cash_cost
+
+    # 转换为pandas.DataFrame，列同原未平仓信息表
+    def to_frame(self):
+        rows = [(lot.price, lot.open_qty, lot.long_short, lot.cost)
+                for lot in self._lots]
+        return pd.DataFrame(rows, columns=LotLedger._COLUMNS)
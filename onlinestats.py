@@ -0,0 +1,175 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import numpy as np
+import pandas as pd
+
+from .analyzer import TRADING_DAYS_PER_YEAR
+
+
+# 单个序列的均值、方差累积器(Welford)，支持按批合并(Chan)
+class _Moments(object):
+
+    __slots__ = ('n', 'mean', 'm2')
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # 离差平方和
+
+    def extend(self, x):
+        nb = len(x)
+        if nb == 0:
+            return
+        mb = x.mean()
+        m2b = ((x - mb) ** 2).sum()
+        n = self.n + nb
+        delta = mb - self.mean
+        self.mean += delta * nb / n
+        self.m2 += m2b + delta * delta * self.n * nb / n
+        self.n = n
+
+    def copy(self):
+        other = _Moments()
+        other.n, other.mean, other.m2 = self.n, self.mean, self.m2
+        return other
+
+    # 总体标准差，同np.std
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / self.n) if self.n else np.nan
+
+
+# 回测过程中的在线统计：由Broker每日更新净值、每笔平仓后更新收益，
+# 夏普、索提诺、最大回撤、胜率等指标可在回测中随时以O(1)获取，定义同analyzer
+class OnlineStats(object):
+
+    def __init__(self, period=TRADING_DAYS_PER_YEAR):
+        '''
+        param period: 年化周期数
+        '''
+        self._period = period
+
+        self._rets = _Moments()  # 每日收益率
+        self._neg_rets = _Moments()  # 每日负收益率
+        self._first = None  # 首日净值
+        self._last = None  # 最新净值
+        self.days = 0  # 已更新净值的交易日数
+        self._before_last = None  # 加入最新交易日净值之前的状态，供覆盖最新净值时恢复
+
+        self.peak = None  # 净值历史最高值
+        self.trough = None  # 最大回撤的谷底净值
+        self.max_drawdown = 0.0  # 最大回撤
+        self.drawdown = 0.0  # 当前回撤
+
+        self.wins = 0  # 盈利平仓笔数
+        self.losses = 0  # 亏损平仓笔数
+        self.trades = 0  # 平仓笔数
+        self._win_sum = 0.0
+        self._loss_sum = 0.0
+
+    # 按时间顺序加入若干交易日的日终净值
+    def extend(self, equity):
+        equity = np.asarray(equity, dtype=np.float64)
+        if len(equity) == 0:
+            return
+        if len(equity) > 1:
+            self._extend(equity[:-1])
+        self._before_last = self._state()
+        self._extend(equity[-1:])
+
+    # 覆盖最新交易日的日终净值(同一交易日重复更新时)，只支持stats[-1] = equity
+    def __setitem__(self, key, value):
+        if key != -1 or self._before_last is None:
+            raise IndexError('only the latest equity can be replaced')
+        self.__dict__.update(self._before_last)
+        self.extend([value])
+
+    _STATE = ('_first', '_last', 'days', 'peak', 'trough', 'max_drawdown', 'drawdown')
+
+    def _state(self):
+        state = {k: getattr(self, k) for k in OnlineStats._STATE}
+        state['_rets'] = self._rets.copy()
+        state['_neg_rets'] = self._neg_rets.copy()
+        return state
+
+    def _extend(self, equity):
+        if self._first is None:
+            self._first = equity[0]
+            prev = equity
+        else:
+            prev = np.concatenate([[self._last], equity])
+        rets = prev[1:] / prev[:-1] - 1
+        self._rets.extend(rets)
+        self._neg_rets.extend(rets[rets < 0])
+
+        # 净值最高值及回撤
+        peaks = np.maximum.accumulate(equity)
+        if self.peak is not None:
+            peaks = np.maximum(peaks, self.peak)
+        dds = 1 - equity / peaks
+        i = dds.argmax()
+        if dds[i] > self.max_drawdown:
+            self.max_drawdown = dds[i]
+            self.trough = equity[i]
+        self.peak = peaks[-1]
+        self.drawdown = dds[-1]
+        self._last = equity[-1]
+        self.days += len(equity)
+
+    # 加入一笔平仓收益率
+    def add_trade(self, returns):
+        self.trades += 1
+        if returns > 0:
+            self.wins += 1
+            self._win_sum += returns
+        elif returns < 0:
+            self.losses += 1
+            self._loss_sum += returns
+
+    @property
+    def equity(self):
+        return self._last
+
+    @property
+    def total_return(self):
+        return self._last / self._first - 1 if self.days else np.nan
+
+    @property
+    def annual_volatility(self):
+        return self._rets.std * np.sqrt(self._period)
+
+    @property
+    def sharpe(self):
+        return self._rets.mean * self._period / (self._rets.std * np.sqrt(self._period))
+
+    @property
+    def sortino(self):
+        return self._rets.mean * self._period / (self._neg_rets.std * np.sqrt(self._period))
+
+    @property
+    def win_rate(self):
+        return self.wins / self.trades if self.trades else np.nan
+
+    @property
+    def profit_loss_ratio(self):
+        if self.wins == 0 or self.losses == 0:
+            return np.nan
+        return (self._win_sum / self.wins) / abs(self._loss_sum / self.losses)
+
+    # 当前统计信息快照
+    def to_series(self):
+        stats = pd.Series()
+        stats['交易日数'] = self.days
+        stats['最新净值'] = self.equity
+        stats['累计收益'] = self.total_return
+        stats['年化波动率'] = self.annual_volatility
+        stats['最大回撤'] = self.max_drawdown
+        stats['当前回撤'] = self.drawdown
+        stats['交易笔数'] = self.trades
+        stats['盈亏比'] = self.profit_loss_ratio
+        stats['胜率'] = self.win_rate
+        stats['夏普率'] = self.sharpe
+        stats['索提诺比率'] = self.sortino
+        return stats
@@ -0,0 +1,260 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import heapq
+import itertools
+import numpy as np
+import pandas as pd
+
+
+# 挂单
+class Order(object):
+
+    __slots__ = ('id', 'security', 'shares', 'long_short', 'kind', 'stop', 'limit',
+                 'tif', 'created', 'status', 'filled_at', 'fill_price')
+
+    _COLUMNS = ['security', 'shares', 'long_short', 'kind', 'stop', 'limit', 'tif',
+                'created', 'status', 'filled_at', 'fill_price']
+
+    def __init__(self, oid, security, shares, long_short, kind, stop, limit, tif, created):
+        self.id = oid
+        self.security = security
+        self.shares = shares  # 正数为开仓，负数为平仓
+        self.long_short = long_short
+        self.kind = kind  # 'limit', 'stop', 'stop_limit'
+        self.stop = stop  # 止损触发价
+        self.limit = limit  # 限价
+        self.tif = tif  # 'gtc'撤单前有效, 'day'当日有效
+        self.created = created
+        self.status = 'open'  # 'open', 'filled', 'rejected', 'cancelled', 'expired'
+        self.filled_at = None
+        self.fill_price = None
+
+    # 买入方向：多开或空平
+    @property
+    def is_buy(self):
+        return (self.shares > 0) == (self.long_short == 'long')
+
+
+# 挂单簿：限价单、止损单、止损限价单，按标的及触发价分别存于堆中
+#   买入限价: 最低价 <= 限价时成交，成交价min(开盘价, 限价)
+#   卖出限价: 最高价 >= 限价时成交，成交价max(开盘价, 限价)
+#   买入止损: 最高价 >= 触发价时按max(开盘价, 触发价)市价成交
+#   卖出止损: 最低价 <= 触发价时按min(开盘价, 触发价)市价成交
+#   止损限价单: 触发价p按止损单规则确定，同一根bar内只以触发之后的价格成交：
+#     买入: p <= 限价时成交价p；以开盘价触发(开盘价 >= 触发价)且最低价 <= 限价时成交价为限价
+#     卖出: p >= 限价时成交价p；以开盘价触发(开盘价 <= 触发价)且最高价 >= 限价时成交价为限价
+#     否则转为限价单，自下一根bar起按限价单规则撮合
+# 各标的四类挂单中最先触发的价格保存在数组中，每根bar以向量化比较找出被触发的标的，
+# 只有被触发的挂单才逐笔交由Broker.order_share成交
+class OrderBook(object):
+
+    # 各类挂单堆的排序符号：1为触发价低者优先(最小堆)，-1为触发价高者优先(以负值存入最小堆)
+    _SIDES = {'buy_limit': -1, 'sell_limit': 1, 'buy_stop': 1, 'sell_stop': -1}
+
+    def __init__(self, securities):
+        self._secs = list(securities)
+        self._sec_pos = {sec: j for j, sec in enumerate(self._secs)}
+        n = len(self._secs)
+        self._heaps = {side: [[] for _ in range(n)] for side in OrderBook._SIDES}
+        # 各标的各类挂单的最优触发价，无挂单时为不会触发的±inf
+        self._best = {side: np.full(n, sign * np.inf)
+                      for side, sign in OrderBook._SIDES.items()}
+        self._orders = []  # 所有挂单
+        self._open = 0  # 未成交挂单数
+        self._day_orders = []  # 当日有效挂单
+        self._ids = itertools.count()
+        self._index = None
+        self._bars = None
+
+    # 序列化时不保存行情数据(断点续跑时重新绑定)
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_ids'] = next(self._ids)
+        state['_index'] = state['_bars'] = None
+        return state
+
+    def __setstate__(self, state):
+        state['_ids'] = itertools.count(state['_ids'])
+        self.__dict__.update(state)
+
+    # 绑定回测行情(BarData)，撮合时只读取有挂单的标的在撮合区间内的开、高、低价，标的顺序同securities
+    def attach(self, index, bars):
+        self._index = index
+        self._bars = bars
+
+    @property
+    def pending(self):
+        return self._open
+
+    def submit(self, security, shares, long_short, kind, stop, limit, tif, now):
+        if security not in self._sec_pos:
+            raise KeyError('no trading data for %s' % security)
+        if shares == 0:
+            raise ValueError('shares must not be 0')
+        if long_short not in ('long', 'short'):
+            raise ValueError("long_short must be 'long' or 'short'")
+        if tif not in ('gtc', 'day'):
+            raise ValueError("tif must be 'gtc' or 'day'")
+        order = Order(next(self._ids), security, shares, long_short, kind, stop, limit,
+                      tif, now)
+        self._orders.append(order)
+        self._open += 1
+        if tif == 'day':
+            self._day_orders.append(order)
+        if kind == 'limit':
+            self._push(order, 'limit', limit)
+        else:
+            self._push(order, 'stop', stop)
+        return order.id
+
+    def _push(self, order, trigger, price):
+        side = ('buy_' if order.is_buy else 'sell_') + trigger
+        sign = OrderBook._SIDES[side]
+        j = self._sec_pos[order.security]
+        heapq.heappush(self._heaps[side][j], (sign * price, order.id, order))
+        self._refresh(side, j)
+
+    # 丢弃堆顶已失效的挂单，更新最优触发价
+    def _refresh(self, side, j):
+        heap = self._heaps[side][j]
+        while heap and heap[0][2].status != 'open':
+            heapq.heappop(heap)
+        sign = OrderBook._SIDES[side]
+        self._best[side][j] = sign * heap[0][0] if heap else sign * np.inf
+
+    def _close(self, order, status):
+        order.status = status
+        self._open -= 1
+
+    def cancel(self, order_id):
+        order = self._find(order_id)
+        if order is None or order.status != 'open':
+            return False
+        self._close(order, 'cancelled')
+        j = self._sec_pos[order.security]
+        for side in OrderBook._SIDES:
+            self._refresh(side, j)
+        return True
+
+    def _find(self, order_id):
+        # id按提交顺序递增，与在列表中的位置一致
+        if 0 <= order_id < len(self._orders):
+            return self._orders[order_id]
+
+    # 当日有效的挂单在每日收盘后失效
+    def expire_day(self, before=None):
+        '''
+        param before: 只使早于该时刻提交的挂单失效，None为全部；
+                      日频数据中algo在收盘后下单，当日有效的挂单应保留至下一交易日收盘
+        '''
+        touched = set()
+        keep = []
+        for order in self._day_orders:
+            if order.status != 'open':
+                continue
+            if before is not None and order.created >= before:
+                keep.append(order)
+                continue
+            self._close(order, 'expired')
+            touched.add(self._sec_pos[order.security])
+        self._day_orders = keep
+        for j in touched:
+            for side in OrderBook._SIDES:
+                self._refresh(side, j)
+
+    # 撮合第lo至第hi根bar(含)，按时间顺序找出挂单被触发的bar逐一成交
+    def match(self, broker, lo, hi):
+        now = broker.now
+        best = self._best
+        while self._open and lo <= hi:
+            # 有挂单的标的
+            secs = np.flatnonzero(np.isfinite(best['buy_limit']) | np.isfinite(best['sell_limit']) |
+                                  np.isfinite(best['buy_stop']) | np.isfinite(best['sell_stop']))
+            high = self._bars.window('high', secs, lo, hi)
+            low = self._bars.window('low', secs, lo, hi)
+            hit = (low <= best['buy_limit'][secs, None]) | \
+                (high >= best['sell_limit'][secs, None]) | \
+                (high >= best['buy_stop'][secs, None]) | (low <= best['sell_stop'][secs, None])
+            bars = np.flatnonzero(hit.any(axis=0))
+            if len(bars) == 0:
+                break
+            k = lo + bars[0]
+            broker.now = self._index[k]
+            for j in secs[hit[:, bars[0]]]:
+                self._fill_security(broker, j, k)
+            lo = k + 1
+        broker.now = now
+
+    # 成交某标的在第k根bar被触发的所有挂单(先止损，后限价)
+    def _fill_security(self, broker, j, k):
+        bars = self._bars
+        open_ = bars.window('open', [j], k, k)[0, 0] if 'open' in bars.fields else np.nan
+        high = bars.window('high', [j], k, k)[0, 0]
+        low = bars.window('low', [j], k, k)[0, 0]
+        heaps = self._heaps
+        best = self._best
+        converted = []  # 本bar触发但未能成交的止损限价单，自下一根bar起作为限价单撮合
+
+        for side in ('buy_stop', 'sell_stop'):
+            heap = heaps[side][j]
+            while heap and (high >= best[side][j] if side == 'buy_stop' else low <= best[side][j]):
+                _, _, order = heapq.heappop(heap)
+                self._refresh(side, j)
+                if order.status != 'open':
+                    continue
+                buy = side == 'buy_stop'
+                stop = order.stop
+                price = max(open_, stop) if buy else min(open_, stop)
+                if broker._intrabar is not None:
+                    # 日频策略有1分钟数据时，按日内首次触及触发价的bar确定成交价
+                    touch = broker._intrabar.stop_price(order.security, self._index[k], stop, buy)
+                    price = price if touch is None else touch
+                price = stop if np.isnan(price) else price
+                if order.kind == 'stop_limit':
+                    limit = order.limit
+                    if (price <= limit) if buy else (price >= limit):
+                        self._execute(broker, order, price, True)
+                    elif (open_ >= stop and low <= limit) if buy else (open_ <= stop and high >= limit):
+                        # 以开盘价触发，此后价格回到限价
+                        self._execute(broker, order, limit, True)
+                    else:
+                        converted.append(order)
+                    continue
+                self._execute(broker, order, price, False)
+
+        for side in ('buy_limit', 'sell_limit'):
+            heap = heaps[side][j]
+            while heap and (low <= best[side][j] if side == 'buy_limit' else high >= best[side][j]):
+                _, _, order = heapq.heappop(heap)
+                self._refresh(side, j)
+                if order.status != 'open':
+                    continue
+                limit = order.limit
+                price = min(open_, limit) if side == 'buy_limit' else max(open_, limit)
+                self._execute(broker, order, limit if np.isnan(price) else price, True)
+
+        for order in converted:
+            self._push(order, 'limit', order.limit)
+
+    # 限价单按成交价直接成交，止损单按滑点调整成交价
+    def _execute(self, broker, order, price, real_price):
+        if not real_price:
+            direction = 'open' if order.shares > 0 else 'close'
+            price = broker._real_excute_price(price, direction, order.long_short)
+        ok = broker.order_share(order.security, price, order.shares, order.long_short,
+                                real_price=True)
+        if ok:
+            order.filled_at = broker.now
+            order.fill_price = price
+        self._close(order, 'filled' if ok else 'rejected')
+
+    # 挂单记录
+    def to_frame(self, status=None):
+        orders = self._orders if status is None else \
+            [o for o in self._orders if o.status == status]
+        frame = pd.DataFrame([[getattr(o, c) for c in Order._COLUMNS] for o in orders],
+                             index=[o.id for o in orders], columns=Order._COLUMNS)
+        frame.index.name = 'order_id'
+        return frame
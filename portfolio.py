@@ -0,0 +1,124 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import time
+import numpy as np
+import pandas as pd
+
+from .strategy import Strategy
+from .analyzer import batch_analysis
+from .sweep import _data_key
+
+
+# 多策略组合回测：交易数据只加载一次，时间轴只遍历一次，每根bar依次分发给各子策略，
+# 各子策略有独立的Context及Broker(资金、持仓、成交记录互不影响)
+class Portfolio(object):
+
+    def __init__(self, strategies):
+        '''
+        param strategies: dict，key为子策略名，value为(initialize, algo)或(initialize, algo, kwargs)，
+                          kwargs为传给initialize的关键字参数；子策略的securities、start、end、minute须相同，
+                          交易数据按第一个子策略的context读取
+        '''
+        if not strategies:
+            raise ValueError('strategies must not be empty')
+        self._names = list(strategies)
+        self._specs = []
+        for name in self._names:
+            spec = tuple(strategies[name])
+            if len(spec) == 2:
+                spec += ({},)
+            if len(spec) != 3:
+                raise ValueError('strategy %s must be (initialize, algo[, kwargs])' % name)
+            self._specs.append(spec)
+        self._strategies = None  # dict，子策略名: Strategy，run后生成
+
+    # 执行所有子策略的回测
+    def run(self):
+        # #记录策略耗时
+        t0 = time.time()
+
+        initialize, _, kwargs = self._specs[0]
+        base = Strategy(initialize, **kwargs)
+        data = base.get_trading_data()
+        key = _data_key(base.get_context())
+        strategies = [base]
+        for name, (initialize, _, kwargs) in zip(self._names[1:], self._specs[1:]):
+            strategy = Strategy.from_data(initialize, data, **kwargs)
+            # 交易数据只加载一次，各子策略不能订阅不同的标的、起止日及数据频率
+            if _data_key(strategy.get_context()) != key:
+                raise ValueError('strategy %s must share securities/start/end/minute' % name)
+            strategies.append(strategy)
+
+        # 各子策略需遍历的bar(设置调度规则时各不相同)，合并后按时间顺序遍历一次
+        n = len(data.major_axis)
+        active = []
+        for strategy, (_, algo, _) in zip(strategies, self._specs):
+            steps = strategy._start_run(algo, {})
+            mask = np.zeros(n, dtype=bool)
+            if isinstance(steps, range):
+                mask[steps.start:steps.stop] = True
+            else:
+                mask[steps] = True
+            active.append(mask)
+
+        completed = False
+        try:
+            for i in np.flatnonzero(np.logical_or.reduce(active)):
+                for strategy, mask in zip(strategies, active):
+                    if mask[i]:
+                        strategy._run_bar(i)
+            completed = True
+        finally:
+            for strategy in strategies:
+                strategy._finish_run(completed)
+        self._strategies = dict(zip(self._names, strategies))
+
+        t1 = time.time()
+        print('the portfolio backtesing consuming %f seconds' % (t1 - t0))
+
+    def _check_run(self):
+        if self._strategies is None:
+            raise RuntimeError('call run() first')
+
+    # 获取子策略
+    def get_strategy(self, name):
+        self._check_run()
+        return self._strategies[name]
+
+    # 各子策略的净值曲线，pandas.DataFrame，列为子策略名
+    def get_equity_curves(self):
+        self._check_run()
+        return pd.DataFrame({name: self._strategies[name]._broker.get_equity_curve()
+                             for name in self._names}, columns=self._names)
+
+    # 组合净值曲线(各子策略净值之和)
+    def get_equity_curve(self):
+        pl = self.get_equity_curves().sum(axis=1)
+        pl.name = 'portfolio'
+        return pl
+
+    def backtest_analysis(self):
+        '''
+        return
+        -------
+        result : pandas.DataFrame ;行为各子策略及组合(portfolio)，列为回测统计信息
+        '''
+        self._check_run()
+        pls = self.get_equity_curves()
+        pls['portfolio'] = pls.sum(axis=1)
+        capital = pd.Series({name: self._strategies[name].get_context().cash
+                             for name in self._names})
+        capital['portfolio'] = capital.sum()
+
+        tpls = {}
+        holds = pd.DataFrame(index=pls.index)
+        for name in self._names:
+            broker = self._strategies[name]._broker
+            tpls[name] = broker.get_trade_pl()
+            holds[name] = broker.get_daily_balance().minor_xs('holds').abs().sum(axis=1)
+        tpls['portfolio'] = pd.concat([tpls[name] for name in self._names])
+        holds['portfolio'] = holds.sum(axis=1)
+        return batch_analysis(pls, capital.reindex(pls.columns),
+                              pd.concat(tpls, names=['run']), holds)
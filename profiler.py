@@ -0,0 +1,149 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import sys
+import time
+from collections import OrderedDict
+import pandas as pd
+
+# 计时函数
+clock = time.perf_counter
+
+
+# 进程峰值内存(MB)，无法获取时返回None
+def peak_memory_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # linux单位为KB，macOS为字节
+        return peak / 1024.0 ** 2 if sys.platform == 'darwin' else peak / 1024.0
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / 1024.0 ** 2
+    except ImportError:
+        return None
+
+
+# 回测分阶段耗时统计：由run_backtest在context.profile = True时创建，
+# 记录挂单撮合、行情切片、algo、下单处理及每日净值更新的耗时和调用次数；未开启时不产生任何开销
+class Profiler(object):
+
+    # 被计时的Broker下单处理函数
+    ORDER_METHODS = ('order_share', 'order_target_weights', '_valid_order', '_open_update',
+                     '_close_update', '_record_trade')
+    # 下单入口(algo内这些函数的耗时不计入algo_self)；order_percent及挂单、日内委托的成交均经order_share
+    ORDER_ENTRIES = ('order_share', 'order_target_weights')
+
+    def __init__(self):
+        self._phases = OrderedDict()  # 阶段名: [耗时, 调用次数]
+        for name in ('prepare', 'match', 'slice', 'algo', 'update_broker') + \
+                Profiler.ORDER_METHODS:
+            self._phases[name] = [0.0, 0]
+        self.bars = 0  # 遍历的bar数
+        self.seconds = 0.0  # 回测总耗时
+        self.peak_memory = None  # 进程峰值内存(MB)
+        self._t0 = None
+        # algo内的下单处理耗时(挂单撮合中的成交不计入)
+        self._algo_orders = 0.0
+        self._algo_t0 = None
+        self._algo_orders0 = 0.0
+        self._fills0 = 0
+        self.fills = 0  # 成交笔数，按成交记录计(含批量调仓及挂单撮合的成交)
+
+    def start(self):
+        self._t0 = clock()
+
+    def stop(self):
+        self.seconds = clock() - self._t0
+        self.peak_memory = peak_memory_mb()
+
+    # 下单入口函数的累计耗时
+    def _entries_seconds(self):
+        return sum(self._phases[name][0] for name in Profiler.ORDER_ENTRIES)
+
+    # 累加某阶段的耗时
+    def add(self, phase, seconds):
+        acc = self._phases[phase]
+        acc[0] += seconds
+        acc[1] += 1
+
+    # algo阶段计时，同时记录其中下单处理的耗时
+    def algo_start(self):
+        self._algo_orders0 = self._entries_seconds()
+        self._algo_t0 = clock()
+
+    def algo_stop(self):
+        self.add('algo', clock() - self._algo_t0)
+        self._algo_orders += self._entries_seconds() - self._algo_orders0
+
+    # 以实例属性替换broker的下单处理函数，记录其耗时及调用次数
+    def instrument(self, broker):
+        for name in Profiler.ORDER_METHODS:
+            setattr(broker, name, self._timed(self._phases[name], getattr(broker, name)))
+        self._fills0 = len(broker._tradelog)
+
+    # 恢复broker的下单处理函数，统计期间新增的成交笔数
+    def restore(self, broker):
+        for name in Profiler.ORDER_METHODS:
+            broker.__dict__.pop(name, None)
+        self.fills = len(broker._tradelog) - self._fills0
+
+    @staticmethod
+    def _timed(acc, func):
+        def wrapper(*args, **kwargs):
+            t0 = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                acc[0] += clock() - t0
+                acc[1] += 1
+        return wrapper
+
+    # 各阶段耗时，algo的耗时包含其中的下单处理；order_share等包含algo内下单及挂单撮合中的成交
+    # order_target_weights批量调仓不经order_share等函数，只计入其自身
+    def to_frame(self):
+        '''
+        return: pandas.DataFrame, index为阶段名, 列为seconds(累计耗时), calls(调用次数),
+                per_call_us(平均每次耗时,微秒), pct(占回测总耗时比例)
+        '''
+        phases = OrderedDict((k, list(v)) for k, v in self._phases.items())
+        # algo自身耗时(不含algo内的下单处理)
+        own = phases['algo'][0] - self._algo_orders
+        phases['algo_self'] = [max(own, 0.0), phases['algo'][1]]
+        frame = pd.DataFrame.from_dict(phases, orient='index')
+        frame.columns = ['seconds', 'calls']
+        frame.index.name = 'phase'
+        calls = frame['calls'].where(frame['calls'] > 0)
+        frame['per_call_us'] = frame['seconds'] / calls * 1e6
+        frame['pct'] = frame['seconds'] / self.seconds if self.seconds else float('nan')
+        return frame
+
+    # 汇总信息
+    def summary(self):
+        stats = pd.Series()
+        stats['seconds'] = self.seconds
+        stats['bars'] = self.bars
+        stats['bars_per_sec'] = self.bars / self.seconds if self.seconds else float('nan')
+        stats['algo_calls'] = self._phases['algo'][1]
+        stats['orders'] = sum(self._phases[name][1] for name in Profiler.ORDER_ENTRIES)
+        stats['fills'] = self.fills
+        stats['peak_memory_mb'] = self.peak_memory
+        return stats
+
+    # 导出为json(含summary及phases)或csv(phases)
+    def export(self, path):
+        if path.endswith('.csv'):
+            self.to_frame().to_csv(path)
+            return
+        import json
+        report = {'summary': self.summary().to_dict(),
+                  'phases': self.to_frame().to_dict(orient='index')}
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, default=float)
+
+    def __repr__(self):
+        return '%s\n%s' % (self.summary().to_string(), self.to_frame().to_string())
@@ -0,0 +1,95 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import numpy as np
+import pandas as pd
+
+#####################################################################
+# 由1分钟数据合成N分钟及日频数据
+#   分钟bar的时间戳为bar的结束时刻(如09:31为09:30-09:31)，按交易时段划分，
+#   N分钟bar不跨越午间休市，每个时段最后一根bar截止于时段结束时刻；
+#   开盘价取首根、收盘价取末根、最高/最低价取极值、成交量/成交额求和
+
+# 交易时段(开始, 结束)
+SESSIONS = [('09:30', '11:30'), ('13:00', '15:00')]
+
+_NS_PER_MINUTE = 60 * 10 ** 9
+
+
+def _minute_of_day(t):
+    h, m = t.split(':')
+    return int(h) * 60 + int(m)
+
+
+# 每个交易日最后一根bar的位置
+def day_ends(index):
+    '''
+    param index: pandas.DatetimeIndex, 递增的时间轴
+
+    return: numpy.ndarray, 各交易日最后一根bar在index中的位置
+    '''
+    days = np.asarray(index.values).astype('datetime64[D]')
+    if len(days) == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.append(np.flatnonzero(days[1:] != days[:-1]), len(days) - 1)
+
+
+# 每根1分钟bar所属的N分钟(或日频)bar的时间戳，int64纳秒
+def bar_labels(index, minute=None):
+    '''
+    param index: pandas.DatetimeIndex, 1分钟数据时间轴
+    param minute: int, 合成bar的分钟数，None为日频
+    '''
+    ns = np.asarray(index.values).astype('datetime64[ns]').view(np.int64)
+    day = np.asarray(index.values).astype('datetime64[D]').astype(
+        'datetime64[ns]').view(np.int64)
+    if minute is None:
+        return day
+
+    mod = (ns - day) // _NS_PER_MINUTE
+    starts = np.array([_minute_of_day(s) for s, _ in SESSIONS])
+    ends = np.array([_minute_of_day(e) for _, e in SESSIONS])
+    # 所属交易时段：首个结束时刻不早于该bar的时段；开盘前的bar归入首根，收盘后的bar归入末根
+    s = np.minimum(np.searchsorted(ends, mod, 'left'), len(ends) - 1)
+    length = ends[s] - starts[s]
+    offset = np.clip(mod - starts[s], 1, length)
+    label = starts[s] + np.minimum(((offset - 1) // minute + 1) * minute, length)
+    return day + label * _NS_PER_MINUTE
+
+
+# 将1分钟数据合成为N分钟或日频数据
+def resample_bars(df, minute=None):
+    '''
+    param df: pandas.DataFrame, 按时间递增的1分钟数据，列为open,high,low,close,volume,amount等
+    param minute: int, 合成bar的分钟数，None为日频(时间戳为当日00:00)
+
+    return: pandas.DataFrame, 列同df，其它字段取每根合成bar的最后一个值
+    '''
+    if minute == 1:
+        return df
+    labels = bar_labels(df.index, minute)
+    if len(labels) == 0:
+        return df.iloc[:0]
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    ends = np.r_[starts[1:], len(labels)] - 1
+
+    values = df.values.astype(np.float64)
+    out = np.empty((len(starts), values.shape[1]))
+    for j, col in enumerate(df.columns):
+        x = values[:, j]
+        if col == 'open':
+            out[:, j] = x[starts]
+        elif col == 'high':
+            out[:, j] = np.fmax.reduceat(x, starts)
+        elif col == 'low':
+            out[:, j] = np.fmin.reduceat(x, starts)
+        elif col in ('volume', 'amount'):
+            out[:, j] = np.add.reduceat(np.nan_to_num(x), starts)
+        else:
+            out[:, j] = x[ends]
+
+    index = pd.DatetimeIndex(labels[starts].view('datetime64[ns]'))
+    res = pd.DataFrame(out, index=index, columns=df.columns)
+    res.index.name = df.index.name
+    return res
@@ -5,8 +5,16 @@ __author__ = 'wulinkai'
 from .datahandler import DataHandler
 from .context import Context
 from .broker import Broker
+from .bardata import BarData, RaggedBarData
+from .universe import Universe
+from .execution import ExecutionSimulator
 from .plotting import plot_equity_curve, plot_all
 from .analyzer import analysis
+from .vectorized import run_vectorized
+from . import indicators
+from .profiler import Profiler, clock
+from .resample import day_ends, resample_bars
+import numpy as np
 import pandas as pd
 
 # format data
@@ -33,6 +41,127 @@ class Strategy(object):
 
         # 初始化账户基本信息
         self._broker = Broker(self._data, self._context)
+        self._init_intrabar(self._datahandler)
+        self._profile = None
+        self._begin_at = None  # 断点续跑时新增数据的起始时间
+        self._bars_done = 0  # 已回测的bar数(自起始日起)
+        self._run_state = None  # 回测进行中的状态(行情容器、调度等)，由_start_run生成
+
+    # 由已加载的交易数据构造策略，不再经DataHandler读取(参数扫描等场景共用同一份数据)
+    @classmethod
+    def from_data(cls, initialize, data, **kwargs):
+        '''
+        param initialize: function ,user define
+        param data: pandas.Panel，同get_trading_data()的返回值
+        '''
+        self = cls.__new__(cls)
+        self._context = Context()
+        initialize(self._context, **kwargs)
+        self._datahandler = None
+        self._data = data
+        self._broker = Broker(self._data, self._context)
+        self._init_intrabar(None)
+        self._profile = None
+        self._begin_at = None
+        self._bars_done = 0
+        self._run_state = None
+        return self
+
+    # 日频策略设置context.intrabar时加载1分钟数据，用于VWAP/TWAP委托及止损单的日内成交价
+    def _init_intrabar(self, handler):
+        if not self._context.intrabar:
+            return
+        if self._context.minute is not None:
+            raise ValueError('intrabar execution is only for daily strategies')
+        if handler is None:
+            handler = DataHandler(self._context)
+        self._broker._intrabar = ExecutionSimulator(handler.fetch_intraday())
+
+    # 由断点文件恢复回测状态，只读取断点之后新增的交易数据，之后调用run_backtest续跑
+    @classmethod
+    def from_checkpoint(cls, path, end=None):
+        '''
+        param path: str，save_checkpoint保存的断点文件
+        param end: str，续跑的结束日，默认为原context.end
+
+        断点之后没有新增交易数据时(已到结束日或非交易日)，run_backtest不执行任何bar
+        '''
+        import pickle
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+
+        self = cls.__new__(cls)
+        self._context = context = state['context']
+        self._broker = state['broker']
+        self._profile = None
+        self._bars_done = state['bars_done']
+        self._run_state = None
+        tail = pd.Panel(state['values'], items=state['items'],
+                        major_axis=state['major_axis'], minor_axis=state['minor_axis'])
+        if end is not None:
+            context.end = end
+
+        # 读取断点最后交易日之后的数据
+        first = tail.major_axis[-1].normalize() + pd.Timedelta(days=1)
+        self._datahandler = None
+        self._data = tail
+        self._begin_at = first
+        if first > context.end:
+            return self
+
+        start = context.start
+        context.start = str(first.date())
+        try:
+            self._datahandler = DataHandler(context)
+            new = self._datahandler.fetch_data()
+        finally:
+            context.start = str(start)
+        if len(new.major_axis) == 0:
+            return self
+        # 断点中保存的是对齐数据，续跑时新增数据同样对齐
+        if isinstance(new, Universe):
+            new = new.to_panel()
+
+        self._broker.extend(new, context.minute)
+        if self._broker._intrabar is not None:
+            self._broker._intrabar.set_bars(self._datahandler.fetch_intraday())
+        new = new.reindex(items=tail.items, minor_axis=tail.minor_axis)
+        self._data = pd.Panel(np.concatenate([tail.values, new.values], axis=1),
+                              items=tail.items,
+                              major_axis=tail.major_axis.append(new.major_axis),
+                              minor_axis=tail.minor_axis)
+        return self
+
+    # 保存断点：账户状态(现金、未平仓、每日持仓、成交记录等)、环境变量及最近的交易数据
+    def save_checkpoint(self, path, keep=None):
+        '''
+        param path: str，断点文件路径
+        param keep: int，保存的最近bar数，供续跑时algo及指标读取历史数据；
+                    默认为context.lookback，未设置lookback或登记了指标时保存全部交易数据
+                    (续跑时指标按保存的数据重新计算，数据不足窗口或预热长度时结果与完整回测不同)
+
+        context中用户添加的属性须可被pickle；schedule_on登记的布尔数组按当前时间轴转换为
+        pandas.Series保存，续跑时新增的bar视为False(可clear_schedule后重新登记)
+        '''
+        import copy
+        import pickle
+        if keep is None and not self._context.indicators:
+            keep = self._context.lookback
+        data = self._data
+        lo = 0 if keep is None else max(0, len(data.major_axis) - keep)
+
+        # 布尔数组只对应当前的时间轴，续跑时时间轴长度改变
+        context = copy.copy(self._context)
+        context._schedule = [
+            (kind, pd.Series(np.asarray(arg, dtype=bool), index=data.major_axis))
+            if kind == 'on' and not isinstance(arg, pd.Series) else (kind, arg)
+            for kind, arg in self._context.schedule]
+        state = {'context': context, 'broker': self._broker,
+                 'bars_done': self._bars_done,
+                 'values': data.values[:, lo:, :], 'items': list(data.items),
+                 'major_axis': data.major_axis[lo:], 'minor_axis': list(data.minor_axis)}
+        with open(path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
 
     # 执行回测
     def run_backtest(self, algo, **kwargs):
@@ -43,33 +172,184 @@ class Strategy(object):
         import time
         t0 = time.time()
 
+        steps = self._start_run(algo, kwargs)
+        completed = False
+        try:
+            for i in steps:
+                self._run_bar(i)
+            completed = True
+        finally:
+            # algo异常时同样恢复broker的下单处理函数(被计时替换的函数无法pickle保存断点)
+            self._finish_run(completed)
+
+        t1 = time.time()
+        print('the strategy backtesing consuming %f seconds' % (t1 - t0))
+
+    # 回测准备：行情容器、指标、挂单撮合及调度，返回需遍历的bar位置
+    def _start_run(self, algo, kwargs):
+        # 分阶段耗时统计(context.profile = True时开启)
+        prof = Profiler() if self._context.profile else None
+        if prof is not None:
+            prof.start()
+            prof.instrument(self._broker)
+            tp = clock()
+
         # 回测时间戳
         ts_idx = self._data.major_axis  # panel index
+        # 行情数组容器，algo每根bar获取O(1)的数据视图(设置lookback时只含最近lookback根bar)
+        if isinstance(self._data, Universe):
+            if self._context.legacy_data:
+                raise TypeError('legacy_data is not supported for ragged trading data')
+            bars = RaggedBarData(self._data, self._context.lookback)
+        else:
+            bars = BarData.from_panel(self._data, self._context.lookback)
+        # 预先计算context中登记的指标(已缓存的不再计算)
+        for spec in self._context.indicators:
+            for name, values in indicators.evaluate(bars, spec).items():
+                bars.add_indicator(name, values)
+
+        # 每日交易结束后更新净值的bar(日频每日更新，高频每日最后一根bar后更新)
+        if self._context.minute is None:
+            marks = np.ones(len(ts_idx), dtype=bool)
+        else:
+            marks = np.zeros(len(ts_idx), dtype=bool)
+            marks[day_ends(ts_idx)] = True
+        # 挂单在每根bar的algo之前按该bar的最高、最低价撮合(跳过的bar也会撮合)
+        self._broker._book.attach(ts_idx, bars)
+
+        # 按行情序列回测，跳过起始日(断点续跑时为新增数据的起始)之前的数据
+        start = self._context.start if self._begin_at is None else self._begin_at
+        begin = ts_idx.searchsorted(start)
+        # 调用algo的bar，None为每根bar都调用
+        calls = self._schedule_mask(ts_idx, begin)
 
-        # 按行情序列回测
-        for t in ts_idx:
-            if t < self._context.start:
-                continue
+        # 设置了调度规则时只遍历调度及更新净值的bar
+        if calls is None:
+            steps = range(begin, len(ts_idx))
+        else:
+            steps = np.flatnonzero((calls | marks)[begin:]) + begin
+        if prof is not None:
+            prof.add('prepare', clock() - tp)
+            prof.bars = len(steps)
 
-            self._broker.now = t
-            # 取该时刻及之前数据
-            datas = self._data.ix[:, :t, :]
+        self._run_state = {'algo': algo, 'kwargs': kwargs, 'prof': prof, 'ts_idx': ts_idx,
+                           'bars': bars, 'marks': marks, 'calls': calls,
+                           'begin': begin, 'last': begin - 1}  # last: 上一根已撮合的bar
+        return steps
+
+    # 回测第i根bar：撮合挂单、调用algo、每日收盘后更新净值
+    def _run_bar(self, i):
+        state = self._run_state
+        prof = state['prof']
+        book = self._broker._book
+        t = state['ts_idx'][i]
+
+        self._broker.now = t
+        intrabar = self._broker._intrabar
+        if book.pending or (intrabar is not None and intrabar.pending):
+            if prof is not None:
+                tp = clock()
+            # 此前提交的VWAP/TWAP委托按当日分钟数据成交
+            if intrabar is not None and intrabar.pending:
+                intrabar.execute(self._broker)
+            if book.pending:
+                book.match(self._broker, state['last'] + 1, i)
+            if prof is not None:
+                prof.add('match', clock() - tp)
+        state['last'] = i
+
+        calls = state['calls']
+        if calls is None or calls[i]:
+            if prof is not None:
+                tp = clock()
+            # 移动游标，取该时刻及之前数据
+            bars = state['bars']
+            bars.seek(i)
+            datas = self._data.ix[:, bars.index[0]:t, :] if self._context.legacy_data else bars
+            if prof is not None:
+                prof.add('slice', clock() - tp)
+                prof.algo_start()
 
             # 执行交易逻辑
-            algo(datas, self._broker, self._context, **kwargs)
+            state['algo'](datas, self._broker, self._context, **state['kwargs'])
+            if prof is not None:
+                prof.algo_stop()
 
-            # 每日交易结束后更新净值(日频每日更新，高频每日15点后更新)
-            if self._context.minute is None or t.hour == 15:
-                # 转换成日频数据的 Timestamp('20XX-XX-XX 00:00:00')
-                if self._context.minute is not None:
-                    t = t.replace(hour=0, minute=0, second=0)
+        if state['marks'][i]:
+            if prof is not None:
+                tp = clock()
+            # 转换成日频数据的 Timestamp('20XX-XX-XX 00:00:00')
+            if self._context.minute is not None:
+                t = t.replace(hour=0, minute=0, second=0)
+
+            # 更新每日的持仓市值信息
+            self._broker.update_broker(t)
+            # 当日有效的挂单失效(日频数据中本bar提交的挂单在下一交易日收盘后失效)
+            book.expire_day(t if self._context.minute is None else None)
+            if prof is not None:
+                prof.add('update_broker', clock() - tp)
 
-                # 更新每日的持仓市值信息
-                self._broker.update_broker(t)
+    # 回测结束：completed为False(algo异常中断)时不计入已回测的bar数
+    def _finish_run(self, completed=True):
+        state = self._run_state
+        self._run_state = None
+        if completed:
+            self._bars_done += len(state['ts_idx']) - state['begin']
+
+        prof = state['prof']
+        if prof is not None:
+            prof.restore(self._broker)
+            prof.stop()
+            self._profile = prof
+
+    # 由context的调度规则生成algo调用时点的布尔数组，未设置规则时返回None
+    def _schedule_mask(self, ts_idx, begin):
+        rules = self._context.schedule
+        if not rules:
+            return None
+        mask = np.zeros(len(ts_idx), dtype=bool)
+        for kind, arg in rules:
+            if kind == 'at':
+                mask |= np.isin(ts_idx.hour * 60 + ts_idx.minute, arg)
+            elif kind == 'every':
+                # 续跑时接续此前已回测的bar数计数
+                n, offset = arg
+                mask[begin + (offset - self._bars_done) % n::n] = True
+            else:
+                if isinstance(arg, pd.Series):
+                    arg = arg.reindex(ts_idx).fillna(False).values
+                arg = np.asarray(arg, dtype=bool)
+                if arg.shape != mask.shape:
+                    raise ValueError('schedule mask must match the length of trading data')
+                mask |= arg
+        return mask
+
+    # 执行信号驱动的向量化回测(无需algo函数，结果格式同run_backtest)
+    def run_vectorized(self, signals, prices, shares=None, percent=None):
+        '''
+        param signals: pandas.Series/DataFrame，目标持仓方向(1做多,-1做空,0空仓,NaN沿用上一信号)，
+                       DataFrame的列为标的名; Series的name为标的名(单标的时可省略)
+        param prices: pandas.Series/DataFrame，与signals同格式的下单价格
+        param shares: int，每次开仓的固定手数(同order_share)
+        param percent: float，开仓占剩余现金的比例(同order_percent)；shares与percent只能指定其一，均未指定时为1.0
+        '''
+        import time
+        t0 = time.time()
+
+        run_vectorized(self._broker, self._data.major_axis, self._context,
+                       signals, prices, shares, percent)
 
         t1 = time.time()
         print('the strategy backtesing consuming %f seconds' % (t1 - t0))
 
+    # 获取回测的分阶段耗时统计
+    def get_profile(self):
+        '''
+        return Profiler，最近一次开启context.profile的run_backtest的耗时统计，未开启时为None；
+               summary()为汇总信息，to_frame()为各阶段耗时，export(path)导出为json或csv
+        '''
+        return self._profile
+
     # 获取交易数据
     def get_trading_data(self):
         '''
@@ -120,7 +400,7 @@ class Strategy(object):
             if len(secs) == 1:
                 benchmark = self._data[secs[0]]
                 if self._context.minute is not None:
-                    benchmark = benchmark.at_time('15:00')
+                    benchmark = resample_bars(benchmark)
 
         pl = self._broker.get_equity_curve()
         plot_equity_curve(pl, benchmark, standardize)
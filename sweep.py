@@ -0,0 +1,164 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import time
+import itertools
+import traceback
+import numpy as np
+import pandas as pd
+
+from .strategy import Strategy
+
+# 子进程中已映射的交易数据，key为数据文件路径，每个子进程只映射一次
+_WORKER = {}
+
+
+# 子进程中以np.memmap映射父进程写出的交易数据文件，重建pandas.Panel(不复制数据)
+def _attach_data(shared):
+    path, shape, items, major, minor = shared
+    if _WORKER.get('path') != path:
+        # 写时复制：回测中修改数据只影响本进程
+        values = np.memmap(path, dtype=np.float64, mode='c', shape=shape)
+        data = pd.Panel(values, items=items, major_axis=pd.DatetimeIndex(major),
+                        minor_axis=minor)
+        _WORKER.clear()
+        _WORKER.update(path=path, data=data)
+    return _WORKER['data']
+
+
+# 子进程中执行的任务：映射共享的交易数据后执行单组参数的回测
+def _run_shared(shared, params, initialize, algo, base):
+    return _run_one(params, _attach_data(shared), initialize, algo, base)
+
+
+# 执行单组参数的回测，异常时返回错误信息而不中断其它回测
+def _run_one(params, data, initialize, algo, base=None):
+    t0 = time.time()
+    row = dict(params)
+    try:
+        strategy = Strategy.from_data(initialize, data, **params)
+        context = strategy.get_context()
+        # 交易数据只加载一次，参数不能改变订阅标的、起止日及数据频率
+        if base is not None and base != _data_key(context):
+            raise ValueError('sweep parameters must not change securities/start/end/minute')
+        strategy.run_backtest(algo)
+        row.update(strategy.backtest_analysis()['value'].to_dict())
+        row['error'] = None
+    except Exception:
+        row['error'] = traceback.format_exc()
+    row['seconds'] = time.time() - t0
+    return row
+
+
+def _data_key(context):
+    return (list(context.securities), context.start, context.end, context.minute)
+
+
+def _row_params(row, example):
+    return ', '.join('%s=%s' % (k, row[k]) for k in example)
+
+
+# 参数扫描：交易数据只加载一次，写入临时文件由多个进程以memmap映射并行回测，汇总各组回测统计信息
+class Sweep(object):
+
+    def __init__(self, initialize, algo, grid, processes=None):
+        '''
+        param initialize: function，同Strategy的initialize，参数以关键字参数传入
+        param algo: function，同run_backtest的algo
+        param grid: dict，key为参数名，value为取值列表(取所有组合)；或dict列表，逐组指定
+        param processes: int，并行进程数，默认为CPU核数；1为当前进程内顺序执行
+
+        多进程执行时initialize、algo须为可导入模块中定义的函数(可被pickle)
+        '''
+        self._initialize = initialize
+        self._algo = algo
+        self._params = self._expand(grid)
+        self._processes = processes
+        self.results = None  # pandas.DataFrame;每组参数的回测统计信息
+
+    @staticmethod
+    def _expand(grid):
+        if isinstance(grid, dict):
+            names = list(grid)
+            return [dict(zip(names, values))
+                    for values in itertools.product(*[grid[k] for k in names])]
+        return [dict(p) for p in grid]
+
+    # 执行所有参数组合的回测
+    def run(self, progress=True):
+        '''
+        param progress: bool，是否打印每组回测的完成进度
+
+        return results: pandas.DataFrame，每行为一组参数及其回测统计信息，
+                        error列为失败时的异常信息，seconds列为回测耗时
+        '''
+        params = self._params
+        # 用第一组参数加载交易数据
+        base = Strategy(self._initialize, **params[0])
+        data = base.get_trading_data()
+        key = _data_key(base.get_context())
+
+        processes = self._processes
+        if processes is None:
+            import os
+            processes = os.cpu_count() or 1
+        processes = max(1, min(processes, len(params)))
+
+        t0 = time.time()
+        if processes == 1:
+            rows = []
+            for i, p in enumerate(params):
+                rows.append(_run_one(p, data, self._initialize, self._algo, key))
+                self._report(progress, i + 1, rows[-1], t0)
+        else:
+            rows = self._run_pool(params, data, key, processes, progress, t0)
+
+        self.results = pd.DataFrame(rows, columns=self._columns(rows))
+        return self.results
+
+    def _run_pool(self, params, data, key, processes, progress, t0):
+        import os
+        import tempfile
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        # 交易数据写入临时文件，各子进程以np.memmap映射(只读取一次，不经pickle复制)
+        values = np.ascontiguousarray(data.values, dtype=np.float64)
+        fd, path = tempfile.mkstemp(prefix='wlk_sweep_', suffix='.bin')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                values.tofile(f)
+            shared = (path, values.shape, list(data.items), data.major_axis.values,
+                      list(data.minor_axis))
+            rows = [None] * len(params)
+            with ProcessPoolExecutor(max_workers=processes) as ex:
+                futures = {ex.submit(_run_shared, shared, p, self._initialize, self._algo,
+                                     key): i
+                           for i, p in enumerate(params)}
+                for done, fut in enumerate(as_completed(futures)):
+                    i = futures[fut]
+                    try:
+                        rows[i] = fut.result()
+                    except Exception:  # 子进程异常退出
+                        rows[i] = dict(params[i], error=traceback.format_exc(),
+                                       seconds=np.nan)
+                    self._report(progress, done + 1, rows[i], t0)
+        finally:
+            os.remove(path)
+        return rows
+
+    def _report(self, progress, done, row, t0):
+        if progress:
+            state = 'ok' if row['error'] is None else 'failed'
+            print('[%d/%d] %s %s, elapsed %f seconds' %
+                  (done, len(self._params), _row_params(row, self._params[0]), state,
+                   time.time() - t0))
+
+    def _columns(self, rows):
+        names = list(self._params[0])
+        stats = []
+        for row in rows:
+            for k in row:
+                if k not in names and k not in stats and k not in ('error', 'seconds'):
+                    stats.append(k)
+        return names + stats + ['seconds', 'error']
@@ -0,0 +1,48 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import io
+import os
+import sys
+import shutil
+import contextlib
+import importlib.util
+import pytest
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+# fixture行情，目录结构同DataHandler: Daily/XXX.csv, Minute/X/XXX.csv
+DATA_DIR = os.path.join(TESTS_DIR, 'data')
+REPO_DIR = os.path.dirname(TESTS_DIR)
+
+
+# 以wlkbacktest为包名导入仓库(检出目录名可以不同)
+def _import_package():
+    if 'wlkbacktest' in sys.modules:
+        return
+    spec = importlib.util.spec_from_file_location(
+        'wlkbacktest', os.path.join(REPO_DIR, '__init__.py'),
+        submodule_search_locations=[REPO_DIR])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['wlkbacktest'] = module
+    spec.loader.exec_module(module)
+
+
+_import_package()
+
+
+# 屏蔽回测过程中打印的耗时等信息
+@contextlib.contextmanager
+def quiet():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+# 复制到临时目录的fixture行情(二进制缓存写在其下的Cache/)
+@pytest.fixture
+def data_path(tmpdir):
+    path = str(tmpdir.join('data'))
+    shutil.copytree(DATA_DIR, path, ignore=shutil.ignore_patterns('baseline'))
+    return path
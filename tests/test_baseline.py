@@ -0,0 +1,134 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import os
+import pytest
+import numpy as np
+import pandas as pd
+
+from conftest import DATA_DIR, quiet
+from wlkbacktest import Strategy
+
+#####################################################################
+# 回测结果与重构前引擎(baseline提交)的对比
+# data/baseline/下的期望结果由baseline引擎以相同的fixture数据及下列init、algo生成，
+# 覆盖多空开仓、加仓、FIFO部分平仓、按比例平仓、停牌(缺失数据)及algo中的账户查询；
+# baseline跨多笔开仓平仓时只按最后一笔的平仓量收取手续费，生成时已改为按全部平仓量收取(同LotLedger)
+
+SECURITIES = ['AAA', 'BBB']
+
+
+def init(context, minute=None):
+    context.securities = SECURITIES
+    context.cash = 1000000
+    context.slippage = 0.1
+    context.commision = 0.03
+    if minute is None:
+        context.start = '2010-01-11'
+        context.end = '2010-04-23'
+    else:
+        context.minute = minute
+        context.start = '2010-01-04'
+        context.end = '2010-01-08'
+    context.bar = 0
+    context.log = []
+
+
+def algo(data, broker, context):
+    context.bar += 1
+    for n, sec in enumerate(context.securities):
+        price = data[sec]['close'][-1]
+        if not price > 0:  # 未上市或停牌
+            continue
+        vol = broker.curr_sec_hold_volume(sec)
+        step = (context.bar + 3 * n) % 8
+        if vol == 0:
+            if step == 0:
+                broker.order_percent(sec, price, 0.3, 'long')
+            elif step == 4:
+                broker.order_share(sec, price, 2000, 'short')
+        else:
+            ls = broker.curr_sec_direction(sec)
+            if step in (1, 5):  # 加仓
+                broker.order_share(sec, price, 500, ls)
+            elif step in (2, 6):  # 部分平仓，按开仓先后平仓
+                broker.order_share(sec, price, -(vol // 3), ls)
+            elif step in (3, 7):
+                broker.order_percent(sec, price, -1, ls)
+    pl = broker.curr_portfolio()
+    total = broker.curr_hold_value()
+    context.log.append((broker.curr_hold_nums(), broker.curr_sec_hold_volume('AAA'),
+                        float(broker.curr_sec_hold_value('AAA').sum()),
+                        float(total.iloc[-1]) if len(total) else np.nan,
+                        float(pl.iloc[-1]) if len(pl) else np.nan))
+
+
+LOG_COLUMNS = ['hold_nums', 'aaa_volume', 'aaa_value', 'hold_value', 'portfolio']
+
+
+# 回测结果整理为与期望结果文件相同的格式
+def results(strategy):
+    broker = strategy._broker
+    dbal = broker.get_daily_balance()
+    equity = broker.get_equity_curve()
+    equity.name = 'equity'
+    return {
+        'equity': equity.to_frame(),
+        'trades': broker.get_trade_record()[['security', 'price', 'qty', 'direction',
+                                              'long_short']],
+        'trade_pl': broker.get_trade_pl()[['trade_pl', 'cost', 'returns', 'trade_type']],
+        'holds': dbal.minor_xs('holds')[SECURITIES].astype(np.float64),
+        'hold_value': dbal.minor_xs('hold_value')[SECURITIES].astype(np.float64),
+        'log': pd.DataFrame(strategy.get_context().log, columns=LOG_COLUMNS),
+    }
+
+
+def expected(run, name):
+    index_col = None if name == 'log' else 0
+    return pd.read_csv(os.path.join(DATA_DIR, 'baseline', run, name + '.csv'),
+                       index_col=index_col, parse_dates=index_col is not None)
+
+
+def assert_same(frame, baseline):
+    frame = frame.copy()
+    frame.index.name = baseline.index.name
+    for col in frame.columns:
+        if frame[col].dtype.name == 'category':  # 成交记录中的字符串列
+            frame[col] = frame[col].astype(object)
+    pd.util.testing.assert_frame_equal(frame, baseline, check_dtype=False,
+                                       check_less_precise=6)
+
+
+@pytest.mark.parametrize('run, minute', [('daily', None), ('minute5', 5)])
+@pytest.mark.parametrize('legacy_data', [False, True])
+def test_matches_baseline(data_path, run, minute, legacy_data):
+    def setup(context):
+        init(context, minute)
+        context.data_path = data_path
+        context.legacy_data = legacy_data
+
+    with quiet():
+        strategy = Strategy(setup)
+        strategy.run_backtest(algo)
+    for name, frame in results(strategy).items():
+        assert_same(frame, expected(run, name))
+
+
+# 在线统计与回测结束后按净值曲线计算的结果一致
+def test_online_stats_match_equity_curve(data_path):
+    def setup(context):
+        init(context)
+        context.data_path = data_path
+
+    with quiet():
+        strategy = Strategy(setup)
+        strategy.run_backtest(algo)
+    equity = expected('daily', 'equity')['equity'].values
+    stats = strategy._broker.stats
+    assert stats.days == len(equity)
+    assert stats.equity == pytest.approx(equity[-1])
+    drawdown = 1 - equity / np.maximum.accumulate(equity)
+    assert stats.max_drawdown == pytest.approx(drawdown.max())
+    rets = equity[1:] / equity[:-1] - 1
+    assert stats.sharpe == pytest.approx(rets.mean() / rets.std() * np.sqrt(252))
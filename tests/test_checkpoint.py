@@ -0,0 +1,60 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import quiet
+from test_baseline import init
+from wlkbacktest import Strategy
+
+END = '2010-04-23'
+
+
+# 递归计算的指标，取值依赖全部历史数据(预热)
+def ema(x, span):
+    return pd.DataFrame(x).ewm(span=span).mean().values
+
+
+def algo(data, broker, context):
+    for sec in context.securities:
+        price = data[sec]['close'][-1]
+        avg = data[sec]['ema'][-1]
+        if not price > 0 or np.isnan(avg):
+            continue
+        vol = broker.curr_sec_hold_volume(sec)
+        if vol == 0 and price > avg:
+            broker.order_percent(sec, price, 0.3, 'long')
+        elif vol and price < avg:
+            broker.order_share(sec, price, -vol, 'long')
+
+
+def make_setup(data_path, end, lookback=None):
+    def setup(context):
+        init(context)
+        context.data_path = data_path
+        context.end = end
+        context.lookback = lookback
+        context.add_indicator('ema', ema, span=10)
+    return setup
+
+
+# 断点续跑与完整回测结果一致(设置了lookback且登记了指标时默认保存全部交易数据)
+@pytest.mark.parametrize('lookback', [None, 3])
+def test_resume_matches_full_run(tmpdir, data_path, lookback):
+    path = str(tmpdir.join('ck.pkl'))
+    with quiet():
+        full = Strategy(make_setup(data_path, END, lookback))
+        full.run_backtest(algo)
+        part = Strategy(make_setup(data_path, '2010-02-26', lookback))
+        part.run_backtest(algo)
+        part.save_checkpoint(path)
+        resumed = Strategy.from_checkpoint(path, end=END)
+        resumed.run_backtest(algo)
+    a, b = full._broker, resumed._broker
+    assert len(a.get_trade_record()) > 0
+    pd.util.testing.assert_series_equal(a.get_equity_curve(), b.get_equity_curve())
+    pd.util.testing.assert_frame_equal(a.get_trade_record(), b.get_trade_record())
+    pd.util.testing.assert_frame_equal(a.get_trade_pl(), b.get_trade_pl())
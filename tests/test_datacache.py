@@ -0,0 +1,92 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import DATA_DIR
+from wlkbacktest.datacache import BarCache, CsvIndex
+
+CSV_FILES = [os.path.join('Daily', 'AAA.csv'), os.path.join('Daily', 'BBB.csv'),
+             os.path.join('Minute', '5', 'AAA.csv'), os.path.join('Minute', '1', 'AAA.csv')]
+RANGES = [('2000-01-01', '2100-01-01'), ('2010-01-05', '2010-01-05'),
+          ('2010-01-06', '2010-02-10'), ('2012-01-01', '2012-02-01')]
+
+
+# 重构前DataHandler的读取方式
+def read_csv(csv_file, start, end):
+    df = pd.read_csv(csv_file, index_col=0, parse_dates=True)
+    return df.loc[start:end]
+
+
+@pytest.fixture
+def csv_copy(tmpdir):
+    def copy(name):
+        path = str(tmpdir.join(name.replace(os.sep, '_')))
+        shutil.copyfile(os.path.join(DATA_DIR, name), path)
+        return path
+    return copy
+
+
+@pytest.mark.parametrize('name', CSV_FILES)
+def test_fetch_matches_read_csv(tmpdir, name):
+    csv_file = os.path.join(DATA_DIR, name)
+    cache = BarCache(str(tmpdir.join('cache')))
+    for _ in range(2):  # 首次由csv建立缓存，之后由memmap读取
+        for start, end in RANGES:
+            pd.util.testing.assert_frame_equal(cache.fetch(csv_file, start, end),
+                                               read_csv(csv_file, start, end))
+    dates, values, fields = cache.load(csv_file)
+    assert isinstance(values, np.memmap)
+
+
+def test_rebuild_when_csv_changes(tmpdir, csv_copy):
+    csv_file = csv_copy(CSV_FILES[0])
+    cache = BarCache(str(tmpdir.join('cache')))
+    cache.load(csv_file)
+    df = pd.read_csv(csv_file, index_col=0, parse_dates=True)
+    df['close'] += 1
+    df.iloc[:-3].to_csv(csv_file)
+    pd.util.testing.assert_frame_equal(cache.fetch(csv_file, '2000-01-01', '2100-01-01'),
+                                       read_csv(csv_file, '2000-01-01', '2100-01-01'))
+
+
+# 缓存目录不可写时使用解析的csv数据
+def test_unwritable_cache_dir(tmpdir):
+    csv_file = os.path.join(DATA_DIR, CSV_FILES[2])
+    blocker = tmpdir.join('file')
+    blocker.write('')
+    cache = BarCache(os.path.join(str(blocker), 'cache'))
+    pd.util.testing.assert_frame_equal(cache.fetch(csv_file, '2010-01-05', '2010-01-06'),
+                                       read_csv(csv_file, '2010-01-05', '2010-01-06'))
+
+
+@pytest.mark.parametrize('name', CSV_FILES)
+def test_csv_index_matches_read_csv(tmpdir, name):
+    csv_file = os.path.join(DATA_DIR, name)
+    index = CsvIndex(str(tmpdir.join('index')))
+    for _ in range(2):  # 首次扫描并保存索引，之后读取索引文件
+        for start, end in RANGES:
+            pd.util.testing.assert_frame_equal(index.fetch(csv_file, start, end),
+                                               read_csv(csv_file, start, end))
+
+
+# 日期无序及索引目录不可写时按整个文件读取或只在内存中使用索引
+def test_csv_index_unsorted_and_unwritable(tmpdir, csv_copy):
+    csv_file = csv_copy(CSV_FILES[1])
+    df = pd.read_csv(csv_file, index_col=0, parse_dates=True)
+    df.iloc[::-1].to_csv(csv_file)
+    index = CsvIndex(str(tmpdir.join('index')))
+    pd.util.testing.assert_frame_equal(index.fetch(csv_file, '2010-01-20', '2010-02-05'),
+                                       df.loc['2010-01-20':'2010-02-05'])
+
+    blocker = tmpdir.join('file')
+    blocker.write('')
+    csv_file = os.path.join(DATA_DIR, CSV_FILES[2])
+    index = CsvIndex(os.path.join(str(blocker), 'index'))
+    pd.util.testing.assert_frame_equal(index.fetch(csv_file, '2010-01-06', '2010-01-07'),
+                                       read_csv(csv_file, '2010-01-06', '2010-01-07'))
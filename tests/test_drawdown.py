@@ -0,0 +1,52 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from wlkbacktest.drawdown import rolling_max_drawdown, rolling_max_runup
+
+
+# 逐窗口直接计算
+def brute_force(values, window, runup):
+    out = np.full(values.shape, np.nan)
+    for t in range(window - 1, len(values)):
+        x = values[t - window + 1:t + 1]
+        if runup:
+            out[t] = np.max(x / np.minimum.accumulate(x, axis=0) - 1, axis=0)
+        else:
+            out[t] = np.max(1 - x / np.maximum.accumulate(x, axis=0), axis=0)
+    return out
+
+
+def random_walk(shape, seed):
+    rng = np.random.RandomState(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.02, shape), axis=0))
+
+
+@pytest.mark.parametrize('runup', [False, True])
+@pytest.mark.parametrize('n, window', [(1, 1), (10, 1), (10, 3), (37, 5), (50, 50),
+                                       (64, 8), (100, 7), (5, 9)])
+def test_matches_brute_force(n, window, runup):
+    values = random_walk((n, 3), n * 31 + window)
+    func = rolling_max_runup if runup else rolling_max_drawdown
+    np.testing.assert_allclose(func(values, window), brute_force(values, window, runup),
+                               rtol=1e-12, atol=1e-15)
+
+
+def test_pandas_input_and_window_list():
+    pl = pd.Series(random_walk(60, 7), index=pd.bdate_range('2010-01-04', periods=60),
+                   name='pl')
+    res = rolling_max_drawdown(pl, [20, 5])
+    assert isinstance(res, pd.DataFrame)
+    assert list(res.columns) == [20, 5]
+    assert res.index.equals(pl.index)
+    for w in (20, 5):
+        np.testing.assert_allclose(res[w].values, brute_force(pl.values, w, False),
+                                   rtol=1e-12)
+    single = rolling_max_runup(pl.to_frame(), 10)
+    assert isinstance(single, pd.DataFrame)
+    np.testing.assert_allclose(single['pl'].values, brute_force(pl.values, 10, True),
+                               rtol=1e-12)
@@ -0,0 +1,62 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import random
+import pytest
+
+from wlkbacktest.ledger import LotLedger
+
+
+# 重构前Broker._close_update的逐笔平仓算法，lots为[开仓价, 未平仓量]列表
+def reference_close(lots, close_price, close_qty, long_short):
+    re_cash_pl = re_cash_cost = 0
+    for lot in lots:
+        price_i, vol_i = lot
+        price_diff = close_price - price_i
+        if vol_i < close_qty:
+            re_cash_pl += vol_i * price_diff if long_short == 'long' else vol_i * -price_diff
+            re_cash_cost += vol_i * price_i
+            lot[1] = 0
+            close_qty -= vol_i
+        else:
+            re_cash_pl += close_qty * \
+                price_diff if long_short == 'long' else close_qty * -price_diff
+            re_cash_cost += close_qty * price_i
+            lot[1] = vol_i - close_qty
+            break
+    return [lot for lot in lots if lot[1] != 0], re_cash_pl, re_cash_cost
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_fifo_matches_reference(seed):
+    rng = random.Random(seed)
+    ledger = LotLedger()
+    lots = []
+    long_short = rng.choice(['long', 'short'])
+    for _ in range(50):
+        if not lots or rng.random() < 0.5:
+            price, qty = round(rng.uniform(5, 10), 2), rng.randint(1, 500)
+            ledger.open(price, qty, long_short)
+            lots.append([price, qty])
+        else:
+            qty = rng.randint(1, sum(lot[1] for lot in lots))
+            price = round(rng.uniform(5, 10), 2)
+            lots, pl, cost = reference_close(lots, price, qty, long_short)
+            assert ledger.close(price, qty, long_short) == (pl, cost)
+
+        assert ledger.qty == sum(lot[1] for lot in lots)
+        assert ledger.cost == pytest.approx(sum(p * q for p, q in lots))
+        assert len(ledger) == len(lots)
+        assert ledger.long_short == (long_short if lots else None)
+
+
+def test_close_all_resets_totals():
+    ledger = LotLedger()
+    ledger.open(10.1, 300, 'short')
+    ledger.open(10.3, 200, 'short')
+    pl, cost = ledger.close(10.0, 500, 'short')
+    assert pl == pytest.approx(300 * 0.1 + 200 * 0.3)
+    assert cost == pytest.approx(300 * 10.1 + 200 * 10.3)
+    assert (ledger.qty, ledger.cost, ledger.long_short, len(ledger)) == (0, 0.0, None, 0)
+    assert list(ledger.to_frame().columns) == ['price', 'open_qty', 'long_short', 'cost']
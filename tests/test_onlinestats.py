@@ -0,0 +1,58 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import numpy as np
+import pytest
+
+from wlkbacktest.onlinestats import OnlineStats
+
+
+def random_equity(n, seed):
+    rng = np.random.RandomState(seed)
+    return 1e6 * np.cumprod(1 + rng.normal(0, 0.02, n))
+
+
+def assert_same_stats(stats, expected):
+    a, b = stats.to_series(), expected.to_series()
+    assert list(a.index) == list(b.index)
+    np.testing.assert_allclose(a.values.astype(float), b.values.astype(float), rtol=1e-10)
+    assert (stats.days, stats.equity, stats.peak, stats.drawdown) == \
+        pytest.approx((expected.days, expected.equity, expected.peak, expected.drawdown))
+
+
+# 分批加入与一次加入结果一致
+@pytest.mark.parametrize('seed', range(5))
+def test_extend_in_chunks(seed):
+    equity = random_equity(60, seed)
+    whole = OnlineStats()
+    whole.extend(equity)
+    chunks = OnlineStats()
+    for part in np.array_split(equity, [1, 2, 10, 11, 40]):
+        chunks.extend(part)
+    assert_same_stats(chunks, whole)
+
+
+# 覆盖最新交易日净值(可多次)，结果同只加入最终的净值
+@pytest.mark.parametrize('seed', range(5))
+def test_replace_latest_equity(seed):
+    equity = random_equity(30, seed)
+    stats = OnlineStats()
+    stats.extend(equity[:20])
+    stats[-1] = equity[19] * 0.5  # 新的最大回撤
+    stats[-1] = equity[19] * 1.5  # 新的最高值
+    stats[-1] = equity[19]
+    stats.extend(equity[20:25])
+    stats[-1] = 2 * equity[24]
+    expected = OnlineStats()
+    expected.extend(np.append(equity[:24], 2 * equity[24]))
+    assert_same_stats(stats, expected)
+
+
+def test_replace_only_latest():
+    stats = OnlineStats()
+    with pytest.raises(IndexError):
+        stats[-1] = 1.0
+    stats.extend([1.0, 1.1])
+    with pytest.raises(IndexError):
+        stats[0] = 1.0
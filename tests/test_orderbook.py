@@ -0,0 +1,128 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from wlkbacktest.bardata import BarData
+from wlkbacktest.orderbook import OrderBook
+
+FIELDS = ['open', 'high', 'low', 'close']
+INDEX = pd.date_range('2010-01-04', periods=3)
+# 单一标的三根bar的开、高、低、收
+BARS = [[10.0, 10.2, 9.9, 10.0],
+        [10.0, 11.0, 9.9, 10.8],
+        [10.8, 10.9, 10.4, 10.5]]
+SLIPPAGE = 0.01
+
+
+# 只记录成交的Broker，止损单的滑点按买入加、卖出减
+class FakeBroker(object):
+
+    _intrabar = None
+
+    def __init__(self):
+        self.now = None
+        self.fills = []
+        self.accept = True
+
+    def _real_excute_price(self, price, direction, long_short):
+        buy = (direction == 'open') == (long_short == 'long')
+        return price + SLIPPAGE if buy else price - SLIPPAGE
+
+    def order_share(self, security, price, shares, long_short, real_price=False):
+        if self.accept:
+            self.fills.append((self.now, price))
+        return self.accept
+
+
+def make_book(bars=BARS):
+    book = OrderBook(['A'])
+    book.attach(INDEX, BarData(np.array([bars], dtype=float), ['A'], INDEX, FIELDS))
+    return book
+
+
+# 在第0根bar收盘后挂单，撮合之后的bar，返回成交记录
+def fill(kind, shares, stop=None, limit=None, long_short='long', tif='gtc', bars=BARS):
+    book = make_book(bars)
+    broker = FakeBroker()
+    oid = book.submit('A', shares, long_short, kind, stop, limit, tif, INDEX[0])
+    book.match(broker, 1, len(INDEX) - 1)
+    return broker.fills, book.to_frame().loc[oid]
+
+
+@pytest.mark.parametrize('shares, long_short, limit, expected', [
+    (100, 'long', 10.0, 10.0),  # 买入限价: 开盘价即达到限价
+    (100, 'long', 9.95, 9.95),  # 盘中触及限价
+    (-100, 'long', 10.85, 10.85),  # 卖出限价(多平)
+    (-100, 'short', 9.95, 9.95),  # 买入限价(空平)
+    (100, 'short', 10.3, 10.3),  # 卖出限价(空开)
+    (100, 'short', 9.8, 10.0),  # 开盘价已高于限价按开盘价
+])
+def test_limit_fill_price(shares, long_short, limit, expected):
+    fills, order = fill('limit', shares, limit=limit, long_short=long_short)
+    assert fills[0][1] == pytest.approx(expected)
+    assert order['status'] == 'filled'
+
+
+@pytest.mark.parametrize('shares, long_short, stop, expected', [
+    (100, 'long', 10.5, 10.5 + SLIPPAGE),  # 买入止损: 盘中触发按触发价
+    (100, 'long', 9.95, 10.0 + SLIPPAGE),  # 开盘价已超过触发价按开盘价
+    (-100, 'long', 9.95, 9.95 - SLIPPAGE),  # 卖出止损
+])
+def test_stop_fill_price(shares, long_short, stop, expected):
+    fills, order = fill('stop', shares, stop=stop, long_short=long_short)
+    assert fills == [(INDEX[1], pytest.approx(expected))]
+
+
+@pytest.mark.parametrize('shares, long_short, stop, limit, expected', [
+    # 开盘价10 < 触发价10.5，触发之后的价格不低于10.5，不能按开盘价或最低价成交
+    (100, 'long', 10.5, 10.6, [(INDEX[1], 10.5)]),
+    # 开盘价即触发，成交价为开盘价
+    (100, 'long', 9.95, 10.6, [(INDEX[1], 10.0)]),
+    # 触发价高于限价，当根bar不成交，第2根bar起按限价单成交
+    (100, 'long', 10.5, 10.45, [(INDEX[2], 10.45)]),
+    # 卖出(多平): 开盘价10 > 触发价9.95，按触发价成交
+    (-100, 'long', 9.95, 9.9, [(INDEX[1], 9.95)]),
+    # 卖出: 以开盘价触发且最高价回到限价
+    (-100, 'long', 10.1, 10.6, [(INDEX[1], 10.6)]),
+])
+def test_stop_limit_fill_price(shares, long_short, stop, limit, expected):
+    fills, order = fill('stop_limit', shares, stop=stop, limit=limit,
+                        long_short=long_short)
+    assert fills == [(t, pytest.approx(p)) for t, p in expected]
+    assert order['fill_price'] == pytest.approx(expected[0][1])
+
+
+def test_stop_limit_never_reaches_limit():
+    fills, order = fill('stop_limit', 100, stop=10.5, limit=10.3)
+    assert fills == []
+    assert order['status'] == 'open'
+
+
+def test_day_order_expires():
+    book = make_book()
+    broker = FakeBroker()
+    oid = book.submit('A', 100, 'long', 'limit', None, 9.0, 'day', INDEX[0])
+    book.match(broker, 1, 1)
+    book.expire_day(before=INDEX[1])
+    assert book.to_frame().loc[oid, 'status'] == 'expired'
+    assert book.pending == 0
+    book.match(broker, 2, 2)
+    assert broker.fills == []
+
+
+def test_cancel_and_reject():
+    book = make_book()
+    broker = FakeBroker()
+    cancelled = book.submit('A', 100, 'long', 'limit', None, 10.0, 'gtc', INDEX[0])
+    book.submit('A', 100, 'long', 'stop', 10.5, None, 'gtc', INDEX[0])
+    assert book.cancel(cancelled)
+    assert not book.cancel(cancelled)
+    broker.accept = False
+    book.match(broker, 1, 2)
+    orders = book.to_frame()
+    assert list(orders['status']) == ['cancelled', 'rejected']
+    assert book.pending == 0
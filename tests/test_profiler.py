@@ -0,0 +1,59 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import pickle
+import pytest
+
+from conftest import quiet
+from test_baseline import SECURITIES, algo, init
+from wlkbacktest import Strategy
+from wlkbacktest.profiler import Profiler
+
+
+def make_strategy(data_path):
+    def setup(context):
+        init(context)
+        context.data_path = data_path
+        context.profile = True
+    return Strategy(setup)
+
+
+# 每5个交易日按目标权重批量调仓
+def rebalance(data, broker, context):
+    context.bar += 1
+    if context.bar % 5 == 1:
+        prices = {sec: data[sec]['close'][-1] for sec in SECURITIES}
+        weight = 0.4 if context.bar % 10 == 1 else 0.1
+        broker.order_target_weights({sec: weight for sec in SECURITIES}, prices)
+
+
+@pytest.mark.parametrize('func', [algo, rebalance])
+def test_orders_and_fills(data_path, func):
+    with quiet():
+        strategy = make_strategy(data_path)
+        strategy.run_backtest(func)
+    broker = strategy._broker
+    summary = strategy.get_profile().summary()
+    assert summary['fills'] == len(broker.get_trade_record()) > 0
+    assert summary['orders'] > 0
+    assert summary['bars'] == summary['algo_calls'] == len(broker.get_equity_curve())
+    for name in Profiler.ORDER_METHODS:
+        assert name not in broker.__dict__
+
+
+# algo异常时同样恢复broker的下单处理函数，账户仍可pickle保存断点
+def test_restore_when_algo_raises(data_path):
+    def failing(data, broker, context):
+        algo(data, broker, context)
+        if context.bar == 30:
+            raise RuntimeError('algo failed')
+
+    with quiet():
+        strategy = make_strategy(data_path)
+        with pytest.raises(RuntimeError):
+            strategy.run_backtest(failing)
+    broker = strategy._broker
+    for name in Profiler.ORDER_METHODS:
+        assert name not in broker.__dict__
+    pickle.dumps(broker)
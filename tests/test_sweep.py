@@ -0,0 +1,77 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import quiet
+from wlkbacktest import Sweep
+from wlkbacktest.benchmark import synthetic_bars, write_synthetic
+
+DAYS = 300  # 回测统计中的年回撤需要一年以上的数据
+DATES = synthetic_bars('SYN0000', DAYS).index
+DATA_PATH = None  # 合成行情目录，由fixture设置(子进程由fork继承)
+SECURITIES = None
+
+
+@pytest.fixture
+def synthetic(tmpdir, monkeypatch):
+    path = str(tmpdir.join('data'))
+    monkeypatch.setitem(globals(), 'SECURITIES', write_synthetic(path, 2, DAYS))
+    monkeypatch.setitem(globals(), 'DATA_PATH', path)
+
+
+# 子进程中须可被pickle，定义在模块中
+def sweep_init(context, percent, window):
+    if window <= 0:
+        raise ValueError('window must be positive')
+    context.data_path = DATA_PATH
+    context.securities = SECURITIES
+    context.cash = 1000000
+    context.start = str(DATES[5].date())
+    context.end = str(DATES[-1].date())
+    context.percent = percent
+    context.window = window
+
+
+def sweep_algo(data, broker, context):
+    for sec in context.securities:
+        close = data[sec]['close']
+        if len(close) < context.window or not close[-1] > 0:
+            continue
+        avg = np.nanmean(close[-context.window:])
+        vol = broker.curr_sec_hold_volume(sec)
+        if vol == 0 and close[-1] > avg:
+            broker.order_percent(sec, close[-1], context.percent, 'long')
+        elif vol and close[-1] < avg:
+            broker.order_share(sec, close[-1], -vol, 'long')
+
+
+def run_sweep(grid, processes):
+    with quiet():
+        return Sweep(sweep_init, sweep_algo, grid, processes=processes).run()
+
+
+# 多进程(memmap映射交易数据)与当前进程内顺序执行的结果一致
+def test_processes_match_sequential(synthetic):
+    grid = {'percent': [0.2, 0.5], 'window': [3, 10]}
+    seq = run_sweep(grid, 1)
+    par = run_sweep(grid, 2)
+    assert seq['error'].isnull().all(), seq['error'].dropna().tolist()
+    assert par['error'].isnull().all(), par['error'].dropna().tolist()
+    columns = [c for c in seq.columns if c != 'seconds']
+    pd.util.testing.assert_frame_equal(par[columns], seq[columns])
+    assert seq['window'].tolist() == [3, 10, 3, 10]
+    assert (seq['交易笔数'] > 0).all()
+
+
+# 某组参数回测报错时记录异常信息，其余回测不受影响
+def test_error_row(synthetic):
+    grid = [{'percent': 0.3, 'window': 5}, {'percent': 0.3, 'window': -1},
+            {'percent': 0.5, 'window': 5}]
+    res = run_sweep(grid, 2)
+    assert res['error'].iloc[0] is None
+    assert 'window must be positive' in res['error'].iloc[1]
+    assert res['error'].iloc[2] is None
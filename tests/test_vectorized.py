@@ -0,0 +1,79 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import quiet
+from test_baseline import SECURITIES, init
+from wlkbacktest import Strategy
+
+_SIDE = {1: 'long', -1: 'short', 0: None}
+
+
+def make_strategy(data_path):
+    def setup(context):
+        init(context)
+        context.data_path = data_path
+    return Strategy(setup)
+
+
+# 随机信号，下单价格为收盘价并随机置为NaN(停牌及未上市日本身即为NaN)
+def make_inputs(strategy, seed):
+    rng = np.random.RandomState(seed)
+    close = strategy.get_trading_data().minor_xs('close')[SECURITIES]
+    signals = pd.DataFrame(rng.choice([1, -1, 0] + [np.nan] * 4, size=close.shape),
+                           index=close.index, columns=close.columns)
+    prices = close.mask(rng.rand(*close.shape) < 0.15)
+    return signals, prices
+
+
+# 同样信号的事件驱动回测：每根bar比较目标方向与实际持仓，不一致且价格有效时下单
+def event_algo(signals, prices, shares, percent):
+    pos = np.sign(signals.fillna(method='ffill').fillna(0))
+
+    def algo(data, broker, context):
+        now = broker.now
+        for sec in SECURITIES:
+            side = _SIDE[pos.at[now, sec]]
+            price = prices.at[now, sec]
+            vol = broker.curr_sec_hold_volume(sec)
+            held = broker.curr_sec_direction(sec) if vol else None
+            if held == side or not np.isfinite(price):
+                continue
+            if vol:
+                broker.order_share(sec, price, -vol, held)
+            if side is not None and broker.curr_sec_hold_volume(sec) == 0:
+                if shares is not None:
+                    broker.order_share(sec, price, shares, side)
+                else:
+                    broker.order_percent(sec, price, percent, side)
+    return algo
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+@pytest.mark.parametrize('shares, percent', [(1000, None), (None, 0.3), (None, None),
+                                             (200000, None)])  # 200000股资金不足，每次均被拒绝
+def test_matches_event_driven(data_path, seed, shares, percent):
+    with quiet():
+        vec = make_strategy(data_path)
+        signals, prices = make_inputs(vec, seed)
+        vec.run_vectorized(signals, prices, shares=shares, percent=percent)
+        event = make_strategy(data_path)
+        event.run_backtest(event_algo(signals, prices, shares,
+                                      1.0 if shares is None and percent is None else percent))
+    a, b = vec._broker, event._broker
+    pd.util.testing.assert_series_equal(a.get_equity_curve(), b.get_equity_curve())
+    pd.util.testing.assert_frame_equal(a.get_trade_record(), b.get_trade_record())
+    pd.util.testing.assert_frame_equal(a.get_trade_pl(), b.get_trade_pl())
+    pd.util.testing.assert_panel_equal(a.get_daily_balance(), b.get_daily_balance())
+
+
+def test_shares_and_percent_are_exclusive(data_path):
+    with quiet():
+        strategy = make_strategy(data_path)
+        signals, prices = make_inputs(strategy, 0)
+    with pytest.raises(ValueError):
+        strategy.run_vectorized(signals, prices, shares=100, percent=0.5)
@@ -0,0 +1,116 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import numpy as np
+import pandas as pd
+
+
+# 列式记录缓冲区：每列为预分配的定长numpy数组，写满后容量翻倍
+# 'datetime'列存为int64纳秒时间戳，'category'列存为int32编码，
+# 需要时才一次性生成pandas.DataFrame，并缓存至下次写入
+class ColumnBuffer(object):
+
+    def __init__(self, schema, index=None, capacity=256):
+        '''
+        param schema: list of (列名, 类型)，类型为'datetime'、'category'或numpy dtype
+        param index: 生成DataFrame时作为索引的列名
+        param capacity: 初始容量
+        '''
+        self._index = index
+        self._names = [name for name, _ in schema]
+        self._kinds = dict(schema)
+        self._size = 0
+        self._capacity = capacity
+        self._cols = {}
+        self._categories = {}  # 类别列: [类别列表, {类别: 编码}]
+        for name, kind in schema:
+            if kind == 'datetime':
+                dtype = np.int64
+            elif kind == 'category':
+                dtype = np.int32
+                self._categories[name] = [[], {}]
+            else:
+                dtype = kind
+            self._cols[name] = np.empty(capacity, dtype=dtype)
+        self._frame = None
+
+    def __len__(self):
+        return self._size
+
+    def _grow(self, need):
+        capacity = self._capacity
+        while capacity < need:
+            capacity *= 2
+        for name, col in self._cols.items():
+            new = np.empty(capacity, dtype=col.dtype)
+            new[:self._size] = col[:self._size]
+            self._cols[name] = new
+        self._capacity = capacity
+
+    def _encode(self, name, value):
+        cats, codes = self._categories[name]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(cats)
+            cats.append(value)
+        return code
+
+    # 写入一行，参数顺序同schema
+    def append(self, *values):
+        if self._size == self._capacity:
+            self._grow(self._size + 1)
+        i = self._size
+        for name, value in zip(self._names, values):
+            kind = self._kinds[name]
+            if kind == 'datetime':
+                value = pd.Timestamp(value).value
+            elif kind == 'category':
+                value = self._encode(name, value)
+            self._cols[name][i] = value
+        self._size += 1
+        self._frame = None
+
+    # 批量写入多行
+    def extend(self, columns):
+        '''
+        param columns: dict, key为列名，value为等长的数组或列表
+        '''
+        n = len(columns[self._names[0]])
+        if n == 0:
+            return
+        if self._size + n > self._capacity:
+            self._grow(self._size + n)
+        i = self._size
+        for name in self._names:
+            kind = self._kinds[name]
+            value = columns[name]
+            if kind == 'datetime':
+                value = pd.DatetimeIndex(value).values.astype(
+                    'datetime64[ns]').view(np.int64)
+            elif kind == 'category':
+                value = [self._encode(name, v) for v in value]
+            self._cols[name][i:i + n] = value
+        self._size += n
+        self._frame = None
+
+    # 生成pandas.DataFrame(仅在有新写入后重新生成)
+    def to_frame(self):
+        if self._frame is None:
+            n = self._size
+            data = {}
+            for name in self._names:
+                kind = self._kinds[name]
+                col = self._cols[name][:n]
+                if kind == 'datetime':
+                    data[name] = pd.DatetimeIndex(col.copy().view('datetime64[ns]'))
+                elif kind == 'category':
+                    cats = self._categories[name][0]
+                    data[name] = pd.Categorical.from_codes(col.copy(), cats)
+                else:
+                    data[name] = col.copy()
+            frame = pd.DataFrame(data, columns=self._names)
+            if self._index is not None:
+                frame = frame.set_index(self._index)
+            self._frame = frame
+        return self._frame
@@ -0,0 +1,154 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import numpy as np
+import pandas as pd
+
+
+# 非对齐的多标的行情：各标的只保存自身实际存在的bar(停牌、上市前、退市后不占空间)，
+# 所有标的的bar按标的顺序连续存放于一个(总bar数 × 字段数)数组，
+# 并记录每根bar在主时间轴(所有标的时间戳的并集)上的位置。
+# 提供与pandas.Panel相同的 items、major_axis、minor_axis、minor_xs、[sec] 接口，
+# 对齐的截面数据只在需要时生成，缺失处为NaN(不向前填充)
+class Universe(object):
+
+    def __init__(self, calendar, items, fields, values, rows, offsets):
+        '''
+        param calendar: pandas.DatetimeIndex, 主时间轴
+        param items: 标的名列表
+        param fields: 字段名列表
+        param values: numpy.ndarray, shape (总bar数, 字段数)
+        param rows: numpy.ndarray int64, 每根bar在主时间轴上的位置，各标的内递增
+        param offsets: numpy.ndarray int64, 第i个标的的bar为values[offsets[i]:offsets[i+1]]
+        '''
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        values.flags.writeable = False
+        self._calendar = calendar
+        self._items = list(items)
+        self._fields = list(fields)
+        self._field_pos = {f: i for i, f in enumerate(self._fields)}
+        self._sec_pos = {sec: i for i, sec in enumerate(self._items)}
+        self._values = values
+        self._rows = np.asarray(rows, dtype=np.int64)
+        self._offsets = np.asarray(offsets, dtype=np.int64)
+
+    # 由各标的的DataFrame构造
+    @classmethod
+    def from_frames(cls, datas, fields=None):
+        '''
+        param datas: dict, key为标的名，value为以时间为索引的pandas.DataFrame
+        param fields: 字段名列表，默认为第一个标的的列(各标的列不同时取并集)
+        '''
+        secs = sorted(datas)
+        if fields is None:
+            fields = list(datas[secs[0]].columns)
+            if any(list(datas[sec].columns) != fields for sec in secs):
+                fields = sorted(set().union(*[datas[sec].columns for sec in secs]))
+
+        stamps = [datas[sec].index.values.astype('datetime64[ns]').view(np.int64)
+                  for sec in secs]
+        major = np.unique(np.concatenate(stamps)) if secs else np.empty(0, np.int64)
+        lengths = np.array([len(s) for s in stamps], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        values = np.empty((offsets[-1], len(fields)))
+        rows = np.empty(offsets[-1], dtype=np.int64)
+        for i, sec in enumerate(secs):
+            df = datas[sec]
+            order = np.argsort(stamps[i], kind='mergesort')
+            lo, hi = offsets[i], offsets[i + 1]
+            values[lo:hi] = df.reindex(columns=fields).values[order]
+            rows[lo:hi] = np.searchsorted(major, stamps[i][order])
+
+        calendar = pd.DatetimeIndex(major.view('datetime64[ns]'))
+        return cls(calendar, secs, fields, values, rows, offsets)
+
+    @property
+    def items(self):
+        return pd.Index(self._items)
+
+    @property
+    def major_axis(self):
+        return self._calendar
+
+    @property
+    def minor_axis(self):
+        return pd.Index(self._fields)
+
+    # 实际占用的字节数
+    @property
+    def nbytes(self):
+        return self._values.nbytes + self._rows.nbytes + self._offsets.nbytes
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __contains__(self, sec):
+        return sec in self._sec_pos
+
+    # 某标的自身的行情(不含停牌等缺失的bar)
+    def __getitem__(self, sec):
+        i = self._sec_pos[sec]
+        lo, hi = self._offsets[i], self._offsets[i + 1]
+        return pd.DataFrame(self._values[lo:hi], index=self._calendar[self._rows[lo:hi]],
+                            columns=self._fields)
+
+    # 第i个标的的bar在values中的区间
+    def span(self, i):
+        return self._offsets[i], self._offsets[i + 1]
+
+    # 各标的截止主时间轴第row根bar(含)的bar数
+    def counts(self, row):
+        rows, offsets = self._rows, self._offsets
+        return np.array([np.searchsorted(rows[offsets[i]:offsets[i + 1]], row, 'right')
+                         for i in range(len(self._items))], dtype=np.int64)
+
+    # 某字段在主时间轴指定位置的对齐数据，shape (len(rows), 标的数)，无bar处为NaN
+    def _aligned(self, field, rows):
+        fpos = self._field_pos[field]
+        out = np.full((len(rows), len(self._items)), np.nan)
+        for i in range(len(self._items)):
+            lo, hi = self._offsets[i], self._offsets[i + 1]
+            own = self._rows[lo:hi]
+            k = np.searchsorted(own, rows)
+            found = k < len(own)
+            found[found] = own[k[found]] == rows[found]
+            out[found, i] = self._values[lo + k[found], fpos]
+        return out
+
+    # 对齐的某字段数据(时间 × 标的)，同pandas.Panel.minor_xs；rows为主时间轴位置，默认为全部
+    def minor_xs(self, field, rows=None):
+        if rows is None:
+            rows = np.arange(len(self._calendar))
+        rows = np.asarray(rows, dtype=np.int64)
+        return pd.DataFrame(self._aligned(field, rows), index=self._calendar[rows],
+                            columns=self._items)
+
+    # 主时间轴第row根bar的截面，shape (标的数,)，无bar处为NaN
+    def cross_section(self, field, row):
+        return self._aligned(field, np.array([row], dtype=np.int64))[0]
+
+    # 某字段的对齐矩阵，shape (标的数, 时间长度)
+    def field_matrix(self, field):
+        fpos = self._field_pos[field]
+        out = np.full((len(self._items), len(self._calendar)), np.nan)
+        for i in range(len(self._items)):
+            lo, hi = self._offsets[i], self._offsets[i + 1]
+            out[i, self._rows[lo:hi]] = self._values[lo:hi, fpos]
+        return out
+
+    # 兼容接口：对齐的(标的 × 时间 × 字段)数组(需生成完整的稠密数组)
+    @property
+    def values(self):
+        out = np.full((len(self._items), len(self._calendar), len(self._fields)), np.nan)
+        for i in range(len(self._items)):
+            lo, hi = self._offsets[i], self._offsets[i + 1]
+            out[i, self._rows[lo:hi], :] = self._values[lo:hi]
+        return out
+
+    def to_panel(self):
+        return pd.Panel(self.values, items=self._items, major_axis=self._calendar,
+                        minor_axis=self._fields)
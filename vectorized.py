@@ -0,0 +1,132 @@
+# encoding = utf-8
+
+__author__ = 'wulinkai'
+
+import heapq
+import numpy as np
+import pandas as pd
+
+from .resample import day_ends
+
+# 信号值对应的多空方向
+_SIDE = {1: 'long', -1: 'short', 0: None}
+
+
+# 将Series格式的信号/价格转为以标的名为列的DataFrame
+def _as_frame(ts, securities):
+    if isinstance(ts, pd.DataFrame):
+        return ts
+    name = ts.name if ts.name in securities else None
+    if name is None:
+        if len(securities) != 1:
+            raise ValueError('series name must be one of context.securities')
+        name = securities[0]
+    return ts.to_frame(name)
+
+
+# 信号驱动的向量化回测
+#   持仓方向、开平仓时点、每日持仓及净值均按整个数组计算，只有目标方向变化(及此前未能成交)的bar逐笔
+#   交由Broker.order_share/order_percent成交，滑点、手续费及成交记录与事件驱动回测一致
+def run_vectorized(broker, index, context, signals, prices, shares=None, percent=None):
+    '''
+    param broker: Broker, 尚未进行过交易的账户
+    param index: pandas.DatetimeIndex, 行情时间轴
+    param context: 策略环境变量
+    param signals: pandas.Series/DataFrame, 目标持仓方向, 1做多, -1做空, 0空仓, NaN沿用上一信号
+    param prices: pandas.Series/DataFrame, 与signals同格式的下单价格
+    param shares: int, 每次开仓的固定手数(同order_share)
+    param percent: float, 开仓占剩余现金的比例(同order_percent); shares与percent只能指定其一, 均未指定时为1.0
+    '''
+    if broker._n_marked != 0:
+        raise RuntimeError('run_vectorized requires a broker without history')
+    if shares is not None and percent is not None:
+        raise ValueError('specify only one of shares and percent')
+    if shares is None and percent is None:
+        percent = 1.0
+
+    secs = context.securities
+    signals = _as_frame(signals, secs)
+    prices = _as_frame(prices, secs).reindex(index=index, columns=signals.columns)
+    signals = signals.reindex(index)
+    missing = [sec for sec in signals.columns if sec not in broker._sec_pos]
+    if missing:
+        raise ValueError('no trading data for %s' % missing)
+
+    # 起始日之后每根bar的目标方向，方向变化处为开平仓时点
+    begin = index.searchsorted(context.start)
+    ts = index[begin:]
+    pos = np.sign(signals.fillna(method='ffill').fillna(0).values[begin:])
+    pos = pos.astype(np.int8)
+    px = prices.values[begin:]
+    prev = np.vstack([np.zeros((1, pos.shape[1]), np.int8), pos[:-1]])
+    changed = pos != prev
+    # 待处理的(bar, 标的列)按时间顺序出堆；价格无效或下单失败时实际持仓与目标方向不一致，
+    # 于下一根bar重试直至一致(同事件驱动回测中每根bar比较目标与实际持仓)
+    queue = list(zip(*np.nonzero(changed)))
+    heapq.heapify(queue)
+
+    # 逐笔成交，记录每次处理后该标的的持仓量、成本、方向及账户现金
+    cash0 = broker._cash
+    names = list(signals.columns)
+    bars, cols = [], []
+    ev_holds, ev_cost, ev_ls, ev_cash = [], [], [], []
+    while queue:
+        b, j = heapq.heappop(queue)
+        sec = names[j]
+        price = px[b, j]
+        side = _SIDE[pos[b, j]]
+        ledger = broker._unclosed[sec]
+        if np.isfinite(price):
+            broker.now = ts[b]
+            if ledger.qty != 0 and ledger.long_short != side:
+                broker.order_share(sec, price, -ledger.qty, ledger.long_short)
+            if side is not None and ledger.qty == 0:
+                if shares is not None:
+                    broker.order_share(sec, price, shares, side)
+                else:
+                    broker.order_percent(sec, price, percent, side)
+        held = ledger.long_short if ledger.qty != 0 else None
+        if held != side and b + 1 < len(ts) and not changed[b + 1, j]:
+            heapq.heappush(queue, (b + 1, j))
+        bars.append(b)
+        cols.append(j)
+        ev_holds.append(ledger.qty)
+        ev_cost.append(ledger.cost)
+        ev_ls.append(broker._LS_CODE[ledger.long_short])
+        ev_cash.append(broker._cash)
+    bars = np.array(bars, dtype=np.int64)
+    cols = np.array(cols, dtype=np.int64)
+    ev_holds = np.array(ev_holds, dtype=np.float64)
+    ev_cost = np.array(ev_cost, dtype=np.float64)
+    ev_ls = np.array(ev_ls, dtype=np.int8)
+    ev_cash = np.array(ev_cash, dtype=np.float64)
+
+    # 每日更新时点(日频每根bar，高频每日最后一根bar)的持仓状态取其之前最后一笔成交后的状态
+    if context.minute is None:
+        mark = np.arange(len(ts))
+        rows = broker._dates.get_indexer(ts)
+    else:
+        mark = day_ends(ts)
+        rows = broker._dates.get_indexer(ts[mark].normalize())
+    if len(mark) == 0:
+        return
+
+    shape = (len(mark), len(broker._secs))
+    holds = np.zeros(shape)
+    cost = np.zeros(shape)
+    ls = np.zeros(shape, dtype=np.int8)
+    for j in np.unique(cols):
+        sel = cols == j
+        k = np.searchsorted(bars[sel], mark, 'right') - 1
+        ok = k >= 0
+        col = broker._sec_pos[names[j]]
+        holds[ok, col] = ev_holds[sel][k[ok]]
+        cost[ok, col] = ev_cost[sel][k[ok]]
+        ls[ok, col] = ev_ls[sel][k[ok]]
+
+    if len(bars) == 0:
+        cash = np.full(len(mark), cash0)
+    else:
+        k = np.searchsorted(bars, mark, 'right') - 1
+        cash = np.where(k >= 0, ev_cash[np.maximum(k, 0)], cash0)
+    broker._mark_days(rows, cash, holds, cost, ls)